@@ -18,6 +18,7 @@ a = Analysis(
         "PySide6.QtCore",
         "PySide6.QtGui",
         "PySide6.QtWidgets",
+        "PySide6.QtMultimedia",
         "pygame",
         "yt_dlp",
         "mutagen",
@@ -0,0 +1,87 @@
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from PIL import Image, ImageDraw, ImageOps
+from PySide6.QtGui import QImage
+
+from album_art import fit_album_art, pil_to_qimage
+
+
+def make_cover(side, image_format):
+    img = Image.new("RGB", (side, side))
+    draw = ImageDraw.Draw(img)
+    step = max(1, side // 64)
+    for offset in range(0, side, step):
+        color = (offset * 255 // side, 255 - offset * 255 // side, (offset * 7) % 255)
+        draw.line([(offset, 0), (side - offset, side)], fill=color, width=step)
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, quality=92)
+    return buffer.getvalue()
+
+
+def png_roundtrip(data, size):
+    img = Image.open(io.BytesIO(data))
+    img = ImageOps.fit(img, size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return QImage.fromData(buffer.getvalue(), "PNG")
+
+
+def direct_wrap(data, size):
+    img = Image.open(io.BytesIO(data))
+    img = ImageOps.fit(img, size, Image.Resampling.LANCZOS)
+    return pil_to_qimage(img)
+
+
+def to_qimage_png(img):
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return QImage.fromData(buffer.getvalue(), "PNG")
+
+
+def measure(func, data, size, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        image = func(data, size)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert not image.isNull()
+    return statistics.median(timings), min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Album art decode latency")
+    parser.add_argument("--side", type=int, default=3000, help="embedded cover edge in pixels")
+    parser.add_argument("--target", type=int, default=280, help="album art label edge in pixels")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    size = (args.target, args.target)
+    print(f"cover {args.side}x{args.side} -> {args.target}x{args.target}, {args.runs} runs (median / best ms)")
+    fitted = ImageOps.fit(Image.open(io.BytesIO(make_cover(args.side, "PNG"))), size, Image.Resampling.LANCZOS)
+    print("\nconversion of the fitted cover only")
+    for label, func in (("PNG encode/decode", to_qimage_png), ("direct QImage wrap", pil_to_qimage)):
+        median, best = measure(lambda img, _: func(img), fitted, size, args.runs)
+        print(f"  {label:<30} {median:8.2f} / {best:8.2f}")
+
+    for image_format in ("JPEG", "PNG"):
+        data = make_cover(args.side, image_format)
+        print(f"\n{image_format} cover ({len(data) // 1024} KiB)")
+        for label, func in (
+            ("fit + PNG encode/decode", png_roundtrip),
+            ("fit + direct QImage wrap", direct_wrap),
+            ("fit_album_art", fit_album_art),
+        ):
+            median, best = measure(func, data, size, args.runs)
+            print(f"  {label:<30} {median:8.2f} / {best:8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import argparse
+import math
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from PySide6.QtWidgets import QApplication
+
+from audio_backend import BACKENDS, AudioBackendError, available_backends
+
+
+def make_tone(path, seconds=3.0, rate=44100, freq=440.0):
+    with wave.open(path, "wb") as handle:
+        handle.setnchannels(2)
+        handle.setsampwidth(2)
+        handle.setframerate(rate)
+        frames = bytearray()
+        for i in range(int(seconds * rate)):
+            sample = int(8000 * math.sin(2 * math.pi * freq * i / rate))
+            frames += struct.pack("<hh", sample, sample)
+        handle.writeframes(bytes(frames))
+
+
+def wait_for_audio(app, backend, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        app.processEvents()
+        if backend.position() > 0:
+            return True
+        time.sleep(0.0005)
+    return False
+
+
+def measure(app, backend, paths, runs, timeout):
+    first_audio = []
+    switches = []
+    for run in range(runs):
+        start = time.perf_counter()
+        backend.load(paths[run % len(paths)])
+        backend.play()
+        if wait_for_audio(app, backend, timeout):
+            first_audio.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        backend.load(paths[(run + 1) % len(paths)])
+        backend.play()
+        if wait_for_audio(app, backend, timeout):
+            switches.append((time.perf_counter() - start) * 1000)
+        backend.stop()
+    return first_audio, switches
+
+
+def summarize(label, timings, runs):
+    if not timings:
+        return f"  {label:<22} no audio within timeout"
+    return (
+        f"  {label:<22} median {statistics.median(timings):7.2f} ms"
+        f"  best {min(timings):7.2f} ms  ({len(timings)}/{runs} runs)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio backend latency: click to first audio, track switch cost")
+    parser.add_argument("paths", nargs="*", help="audio files to play (defaults to generated WAV tones)")
+    parser.add_argument("--backend", action="append", choices=sorted(BACKENDS), help="backend(s) to measure")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=2.0, help="seconds to wait for audio per run")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = args.paths
+        if not paths:
+            paths = []
+            for index, freq in enumerate((440.0, 660.0)):
+                path = os.path.join(tmp_dir, f"tone-{index}.wav")
+                make_tone(path, freq=freq)
+                paths.append(path)
+
+        for name in args.backend or available_backends():
+            print(f"{BACKENDS[name].label}")
+            try:
+                backend = BACKENDS[name]()
+            except AudioBackendError as exc:
+                print(f"  unavailable: {exc}")
+                continue
+            backend.set_volume(0.0)
+            first_audio, switches = measure(app, backend, paths, args.runs, args.timeout)
+            backend.shutdown()
+            print(summarize("click to first audio", first_audio, args.runs))
+            print(summarize("track switch", switches, args.runs))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
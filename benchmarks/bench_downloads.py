@@ -0,0 +1,127 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+
+from downloads import AudioDownloader, ydl_params
+
+
+class FakeIE(InfoExtractor):
+    # stands in for a site extractor: every extraction costs one simulated page + API round trip
+    _VALID_URL = r"fake://(?P<id>[\w-]+)"
+    IE_NAME = "fake"
+    base_url = ""
+    latency = 0.0
+    extractions = 0
+    _count_lock = threading.Lock()
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        with FakeIE._count_lock:
+            FakeIE.extractions += 1
+        time.sleep(self.latency)
+        return {
+            "id": video_id,
+            "title": f"Track {video_id}",
+            "url": f"{self.base_url}/audio.webm",
+            "ext": "webm",
+            "vcodec": "none",
+            "acodec": "opus",
+        }
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(directory):
+    handler = lambda *args, **kwargs: _QuietHandler(*args, directory=directory, **kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_params():
+    # no ffmpeg postprocessing, so the numbers are pipeline overhead only
+    params = ydl_params(thumbnail=False)
+    params["noprogress"] = True
+    return params
+
+
+def fake_ydl(params):
+    # skip the default extractors so the generic one can't claim fake:// urls
+    ydl = yt_dlp.YoutubeDL(params, auto_init=False)
+    ydl.add_info_extractor(FakeIE())
+    return ydl
+
+
+def extract_then_download(job):
+    # the previous pipeline: a fresh YoutubeDL per job, resolving the URL twice
+    params = bench_params()
+    params["paths"] = {"home": job["folder"]}
+    with fake_ydl(params) as ydl:
+        ydl.extract_info(job["url"], download=False)
+        ydl.download([job["url"]])
+
+
+class FakeDownloader(AudioDownloader):
+    def create_ydl(self, params):
+        return fake_ydl(params)
+
+
+def measure(func, jobs):
+    FakeIE.extractions = 0
+    timings = []
+    for job in jobs:
+        start = time.perf_counter()
+        func(job)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, FakeIE.extractions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-job download pipeline overhead against a local fake extractor")
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=50.0, help="simulated extraction round trip in ms")
+    parser.add_argument("--size", type=int, default=256, help="served audio size in KiB")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        serve_dir = os.path.join(tmp_dir, "serve")
+        os.makedirs(serve_dir)
+        with open(os.path.join(serve_dir, "audio.webm"), "wb") as handle:
+            handle.write(os.urandom(args.size * 1024))
+        server = serve(serve_dir)
+        FakeIE.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        FakeIE.latency = args.latency / 1000
+
+        downloader = FakeDownloader(bench_params(), pp_params={})
+        print(f"{args.jobs} jobs, {args.latency:.0f} ms simulated extraction, {args.size} KiB each")
+        for label, func in (
+            ("extract + download", extract_then_download),
+            ("single extraction, reused", lambda job: downloader.download(job, lambda **fields: None)),
+        ):
+            folder = tempfile.mkdtemp(dir=tmp_dir)
+            jobs = [{"url": f"fake://{label[:6].strip()}-{i}", "folder": folder} for i in range(args.jobs)]
+            timings, extractions = measure(func, jobs)
+            print(
+                f"  {label:<28} median {statistics.median(timings):7.2f} ms"
+                f"  best {min(timings):7.2f} ms  extractions {extractions}"
+            )
+        downloader.close()
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
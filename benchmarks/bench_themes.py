@@ -0,0 +1,76 @@
+import argparse
+import glob
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from PySide6.QtWidgets import QApplication
+
+
+def measure(func, paths, rounds):
+    timings = []
+    for _ in range(rounds):
+        for path in paths:
+            start = time.perf_counter()
+            func(path)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Theme switching cost across the bundled themes")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    # keep the user's theme cache and config out of the measurement
+    scratch = tempfile.mkdtemp()
+    os.environ["XDG_CACHE_HOME"] = os.path.join(scratch, "cache")
+    os.environ["XDG_CONFIG_HOME"] = os.path.join(scratch, "config")
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    from app import PROJECT_ROOT, MusicPlayer
+    from theme_manager import ThemeManager
+
+    paths = sorted(glob.glob(os.path.join(PROJECT_ROOT, "themes", "*.json")))
+    print(f"{len(paths)} themes, {args.rounds} rounds (median / worst ms)")
+
+    manager = ThemeManager(PROJECT_ROOT)
+    uncached = lambda path: manager.build_stylesheet(ThemeManager(PROJECT_ROOT).load_theme(path)[0])
+    cached = lambda path: manager.stylesheet(manager.load_theme(path)[0])
+    for label, func in (("load + build_stylesheet", uncached), ("load + cached stylesheet", cached)):
+        median, worst = measure(func, paths, args.rounds)
+        print(f"  {label:<28} {median:8.3f} / {worst:8.3f}")
+
+    player = MusicPlayer()
+    player.show()
+    app.processEvents()
+
+    def apply(path):
+        player.apply_theme_from_path(path, persist=False)
+        app.processEvents()
+
+    median, worst = measure(apply, paths, args.rounds)
+    print(f"  {'apply_theme, cycling':<28} {median:8.3f} / {worst:8.3f}")
+    median, worst = measure(apply, paths[:1], args.rounds * len(paths))
+    print(f"  {'apply_theme, same theme':<28} {median:8.3f} / {worst:8.3f}")
+
+    theme, theme_path = player.theme_manager.load_theme(paths[0])
+    accents = ("#aa2222", "#22aa22", "#2222aa")
+
+    def recolor(index):
+        theme["palette"]["accent"] = accents[index % len(accents)]
+        player.apply_theme(dict(theme, palette=dict(theme["palette"])), theme_path, persist=False)
+        app.processEvents()
+
+    median, worst = measure(recolor, range(len(accents)), args.rounds * 3)
+    print(f"  {'apply_theme, palette only':<28} {median:8.3f} / {worst:8.3f}")
+    player.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import QObject, QRect, QRunnable, Qt, QThreadPool, Signal
+from PySide6.QtGui import QImage, QPixmap
+
+try:
+    from mutagen.id3 import ID3
+    from mutagen.mp3 import MP3
+
+    MUTAGEN_AVAILABLE = True
+except ImportError:
+    MUTAGEN_AVAILABLE = False
+
+try:
+    from PIL import Image
+
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+from utils import get_cache_dir
+
+ALBUM_ART_AVAILABLE = MUTAGEN_AVAILABLE and PILLOW_AVAILABLE
+
+
+def read_apic(song_path):
+    audio = MP3(song_path, ID3=ID3)
+    if not audio.tags:
+        return None
+    for key, value in audio.tags.items():
+        if key.startswith("APIC"):
+            return value.data
+    return None
+
+
+def _qt_compatible(img):
+    if img.mode in ("RGB", "RGBA"):
+        return img
+    has_alpha = "A" in img.getbands() or "transparency" in img.info
+    return img.convert("RGBA" if has_alpha else "RGB")
+
+
+def pil_to_qimage(img):
+    img = _qt_compatible(img)
+    if img.mode == "RGBA":
+        image_format = QImage.Format.Format_RGBA8888
+        bytes_per_line = img.width * 4
+    else:
+        image_format = QImage.Format.Format_RGB888
+        bytes_per_line = img.width * 3
+    data = img.tobytes()
+    qimage = QImage(data, img.width, img.height, bytes_per_line, image_format)
+    # the QImage wraps data without copying, so it has to keep the buffer alive
+    qimage._buffer = data
+    return qimage
+
+
+def _fit(img, size):
+    # same centre crop as ImageOps.fit, but large covers get box-reduced before LANCZOS
+    src_w, src_h = img.size
+    target_ratio = size[0] / size[1]
+    if src_w / src_h > target_ratio:
+        crop_w = src_h * target_ratio
+        box = ((src_w - crop_w) / 2, 0, (src_w + crop_w) / 2, src_h)
+    else:
+        crop_h = src_w / target_ratio
+        box = (0, (src_h - crop_h) / 2, src_w, (src_h + crop_h) / 2)
+    return img.resize(size, Image.Resampling.LANCZOS, box=box, reducing_gap=3.0)
+
+
+def fit_album_art(data, size):
+    img = Image.open(io.BytesIO(data))
+    # lets the JPEG decoder downscale by 1/2..1/8 while decoding huge covers
+    img.draft("RGB", size)
+    img = _fit(_qt_compatible(img), size)
+    qimage = pil_to_qimage(img)
+    return None if qimage.isNull() else qimage
+
+
+def fit_pixmap(pixmap, size):
+    scaled = pixmap.scaled(
+        size[0],
+        size[1],
+        Qt.AspectRatioMode.KeepAspectRatioByExpanding,
+        Qt.TransformationMode.SmoothTransformation,
+    )
+    x = (scaled.width() - size[0]) // 2
+    y = (scaled.height() - size[1]) // 2
+    return scaled.copy(QRect(x, y, size[0], size[1]))
+
+
+def load_album_art(song_path, mtime_ns, size, disk_cache=None):
+    if disk_cache is None:
+        data = read_apic(song_path)
+        return fit_album_art(data, size) if data else None
+
+    art_hash = disk_cache.lookup_track(song_path, mtime_ns)
+    if art_hash == "":
+        return None
+    if art_hash:
+        image = disk_cache.load(art_hash, size)
+        if image is not None:
+            return image
+
+    data = read_apic(song_path)
+    art_hash = hashlib.sha1(data).hexdigest() if data else ""
+    disk_cache.store_track(song_path, mtime_ns, art_hash)
+    if not data:
+        return None
+    # another track from the same album may already have put this cover on disk
+    image = disk_cache.load(art_hash, size)
+    if image is None:
+        image = fit_album_art(data, size)
+        if image is not None:
+            disk_cache.store(art_hash, size, image)
+    return image
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir=None, max_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir or os.path.join(get_cache_dir(), "art")
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, "art.db"), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS track_art ("
+                "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, art_hash TEXT NOT NULL)"
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def lookup_track(self, song_path, mtime_ns):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, art_hash FROM track_art WHERE path = ?", (song_path,)
+            ).fetchone()
+        if row is None or row[0] != mtime_ns:
+            return None
+        return row[1]
+
+    def store_track(self, song_path, mtime_ns, art_hash):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO track_art (path, mtime_ns, art_hash) VALUES (?, ?, ?)",
+                (song_path, mtime_ns, art_hash),
+            )
+
+    def _thumb_path(self, art_hash, size):
+        return os.path.join(self.cache_dir, f"{art_hash}-{size[0]}x{size[1]}.png")
+
+    def load(self, art_hash, size):
+        path = self._thumb_path(art_hash, size)
+        if not os.path.isfile(path):
+            return None
+        image = QImage(path)
+        if image.isNull():
+            return None
+        try:
+            # mtime doubles as the last-used stamp for eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return image
+
+    def store(self, art_hash, size, image):
+        path = self._thumb_path(art_hash, size)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        if not image.save(tmp_path, "PNG"):
+            return
+        try:
+            os.replace(tmp_path, path)
+            written = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._measure()
+            else:
+                self._total_bytes += written
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _thumbnails(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".png"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def _measure(self):
+        return sum(size for _, size, _ in self._thumbnails())
+
+    def _evict(self):
+        # drop least recently used thumbnails until we are back under 80% of the budget
+        entries = sorted(self._thumbnails())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.8
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._total_bytes = total
+
+
+class _AlbumArtJob(QRunnable):
+    def __init__(self, loader, key):
+        super().__init__()
+        self.loader = loader
+        self.key = key
+
+    def run(self):
+        song_path, mtime_ns, width, height = self.key
+        try:
+            image = load_album_art(song_path, mtime_ns, (width, height), self.loader.disk_cache)
+        except Exception:
+            image = None
+        self.loader._job_done.emit(self.key, image)
+
+
+class AlbumArtLoader(QObject):
+    art_ready = Signal(object, object)
+    _job_done = Signal(object, object)
+
+    def __init__(self, parent=None, cache_size=64, disk_cache=None):
+        super().__init__(parent)
+        self.cache_size = cache_size
+        self.disk_cache = disk_cache
+        self._cache = OrderedDict()
+        self._pending = set()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self._job_done.connect(self._on_job_done)
+
+    def make_key(self, song_path, size):
+        try:
+            mtime_ns = os.stat(song_path).st_mtime_ns
+        except OSError:
+            mtime_ns = 0
+        return (song_path, mtime_ns, size[0], size[1])
+
+    def request(self, key):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.art_ready.emit(key, self._cache[key])
+            return
+        if key not in self._pending:
+            self._pending.add(key)
+            self._pool.start(_AlbumArtJob(self, key))
+
+    def rescale(self, key):
+        song_path, mtime_ns, width, height = key
+        if key in self._cache:
+            return self._cache[key]
+        source = None
+        for (path, mtime, _, _), pixmap in self._cache.items():
+            if path != song_path or mtime != mtime_ns or pixmap is None:
+                continue
+            if source is None or pixmap.width() * pixmap.height() > source.width() * source.height():
+                source = pixmap
+        if source is None:
+            return None
+        pixmap = fit_pixmap(source, (width, height))
+        if source.width() >= width and source.height() >= height:
+            # downscaled from a bigger cached copy, as good as decoding again
+            self._remember(key, pixmap)
+        return pixmap
+
+    def shutdown(self):
+        self._pool.clear()
+        self._pool.waitForDone(1000)
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+
+    def _on_job_done(self, key, image):
+        self._pending.discard(key)
+        # tracks without art are cached too, so they aren't parsed again
+        pixmap = QPixmap.fromImage(image) if image is not None else None
+        self._remember(key, pixmap)
+        self.art_ready.emit(key, pixmap)
+
+    def _remember(self, key, pixmap):
+        self._cache[key] = pixmap
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
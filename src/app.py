@@ -1,23 +1,18 @@
-import glob
-import io
+import copy
 import os
 import random
 import threading
+import time
 
-os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
-
-import pygame
-import yt_dlp
-from PySide6.QtCore import Qt, QTimer, Signal
-from PySide6.QtGui import QAction, QFont, QIcon, QImage, QPixmap
+from PySide6.QtCore import QFileSystemWatcher, Qt, QTimer, Signal
+from PySide6.QtGui import QAction, QActionGroup, QFont, QIcon, QPixmap
 from PySide6.QtWidgets import (
     QFileDialog,
     QFrame,
     QHBoxLayout,
     QLabel,
     QLineEdit,
-    QListWidget,
-    QListWidgetItem,
+    QListView,
     QMainWindow,
     QMessageBox,
     QPushButton,
@@ -26,33 +21,41 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
-try:
-    from mutagen.id3 import ID3
-    from mutagen.mp3 import MP3
-
-    MUTAGEN_AVAILABLE = True
-except ImportError:
-    MUTAGEN_AVAILABLE = False
-
-try:
-    from PIL import Image, ImageOps
-
-    PILLOW_AVAILABLE = True
-except ImportError:
-    PILLOW_AVAILABLE = False
-
 CURRENT_DIR = os.path.abspath(os.path.dirname(__file__))
 PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
 
-from utils import get_ffmpeg_path, get_resource_path, load_config, save_config
-from theme_manager import ThemeError, ThemeManager
+from audio_backend import BACKENDS, DEFAULT_BACKEND, AudioBackendError, available_backends, create_backend
+from album_art import ALBUM_ART_AVAILABLE, AlbumArtLoader, ThumbnailCache
+from downloads import (
+    CONVERTING,
+    DEFAULT_TRANSCODERS,
+    DEFAULT_WORKERS,
+    DONE,
+    EXPANDED,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    SKIPPED,
+    DownloadQueue,
+    describe_progress,
+    format_bytes,
+)
+from utils import get_resource_path, load_config, save_config
+from library import AUDIO_EXTENSIONS, LibraryIndex, display_name, read_duration, search_text
+from playlist_model import PlaylistModel
+from search import SearchIndex
+from status import StatusReporter
+from theme_manager import ThemeError, ThemeManager, hash_files
 
 
 class MusicPlayer(QMainWindow):
     status_update = Signal(str, str)
     download_button_state = Signal(bool, str)
-    download_clear_url = Signal()
-    reload_playlist_signal = Signal()
+    download_job_update = Signal(dict)
+    download_progress = Signal(dict)
+    scan_batch = Signal(int, list)
+    scan_finished = Signal(int, list, list, object)
+    theme_catalog_ready = Signal(bool)
 
     def __init__(self, initial_folder=None):
         super().__init__()
@@ -62,24 +65,53 @@ class MusicPlayer(QMainWindow):
         if os.path.isfile(icon_path):
             self.setWindowIcon(QIcon(icon_path))
 
-        pygame.mixer.init()
+        self.audio = create_backend(load_config().get("audio_backend", DEFAULT_BACKEND), self)
 
         self.current_folder = None
-        self.playlist = []
-        self.ui_playlist = []
+        self.library_roots = []
+        self.playlist_model = PlaylistModel(self)
+        self.search_index = SearchIndex()
         self.current_index = 0
         self.current_song_name = None
+        self.current_song_path = None
         self.is_playing = False
         self.is_paused = False
-        self.is_downloading = False
+        self.gapless = bool(load_config().get("gapless_playback", True))
+        self._queued_path = None
+        self._track_started_at = None
+        self._track_length = None
+        self._paused_at = None
+        self._paused_total = 0.0
+        self.last_gap_ms = None
+        self.last_theme_apply_ms = None
+        self._applied_stylesheet = None
+        self._scan_generation = 0
+        self._scan_cancel = None
+        self._scan_inserts = []
         self.current_theme_path = None
         self.theme = None
         self.theme_manager = ThemeManager(PROJECT_ROOT)
+        self.theme_hot_reload = bool(load_config().get("theme_hot_reload", False))
+        self._theme_content_hash = None
+        self._catalog_refreshing = False
+        self.library = LibraryIndex()
+        self.album_art = AlbumArtLoader(self, disk_cache=ThumbnailCache())
+        self._album_art_key = None
+        config = load_config()
+        self.downloads = DownloadQueue(
+            self.download_job_update.emit,
+            self.download_progress.emit,
+            config.get("download_workers", DEFAULT_WORKERS),
+            config.get("transcode_workers", DEFAULT_TRANSCODERS),
+            archive=self.library,
+        )
 
         self._setup_ui()
         self._bind_signals()
-        self._start_playback_monitor()
         self._load_initial_theme()
+        self.refresh_theme_catalog()
+        self.downloads.resume_pending()
+        self._update_download_progress()
 
         if initial_folder:
             self.set_folder(initial_folder, show_status=False)
@@ -87,6 +119,13 @@ class MusicPlayer(QMainWindow):
     def _setup_ui(self):
         menu = self.menuBar()
         theme_menu = menu.addMenu("Theme")
+        # filled from the theme catalog once it is built; opening it rechecks the theme dirs
+        self.themes_menu = theme_menu.addMenu("Themes")
+        self.themes_menu.aboutToShow.connect(self.refresh_theme_catalog)
+        self.theme_action_group = QActionGroup(self)
+        self.theme_action_group.setExclusive(True)
+        self._rebuild_themes_menu()
+
         load_theme_action = QAction("Load Theme...", self)
         load_theme_action.triggered.connect(self.choose_theme_file)
         theme_menu.addAction(load_theme_action)
@@ -95,12 +134,45 @@ class MusicPlayer(QMainWindow):
         reload_theme_action.triggered.connect(self.reload_current_theme)
         theme_menu.addAction(reload_theme_action)
 
+        hot_reload_action = QAction("Live Reload", self)
+        hot_reload_action.setCheckable(True)
+        hot_reload_action.setChecked(self.theme_hot_reload)
+        hot_reload_action.toggled.connect(self.set_theme_hot_reload)
+        theme_menu.addAction(hot_reload_action)
+
+        # editors often write a file several times per save; wait for the burst to settle
+        self.theme_watcher = QFileSystemWatcher(self)
+        self.theme_watcher.fileChanged.connect(self._on_theme_file_changed)
+        self.theme_reload_timer = QTimer(self)
+        self.theme_reload_timer.setSingleShot(True)
+        self.theme_reload_timer.setInterval(150)
+        self.theme_reload_timer.timeout.connect(self._hot_reload_theme)
+
         theme_menu.addSeparator()
 
         reset_theme_action = QAction("Reset to Default", self)
         reset_theme_action.triggered.connect(self.reset_theme)
         theme_menu.addAction(reset_theme_action)
 
+        playback_menu = menu.addMenu("Playback")
+        gapless_action = QAction("Gapless Playback", self)
+        gapless_action.setCheckable(True)
+        gapless_action.setChecked(self.gapless)
+        gapless_action.toggled.connect(self.set_gapless)
+        playback_menu.addAction(gapless_action)
+
+        backend_menu = playback_menu.addMenu("Audio Backend")
+        self.backend_action_group = QActionGroup(self)
+        self.backend_action_group.setExclusive(True)
+        for name in available_backends():
+            backend_action = QAction(BACKENDS[name].label, self)
+            backend_action.setData(name)
+            backend_action.setCheckable(True)
+            backend_action.setChecked(name == self.audio.name)
+            backend_action.triggered.connect(lambda checked=False, name=name: self.set_audio_backend(name))
+            self.backend_action_group.addAction(backend_action)
+            backend_menu.addAction(backend_action)
+
         root = QWidget(self)
         root.setObjectName("rootWidget")
         self.setCentralWidget(root)
@@ -113,6 +185,10 @@ class MusicPlayer(QMainWindow):
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Filter songs...")
         self.search_input.textChanged.connect(self.handle_playlist_search)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(80)
+        self.search_timer.timeout.connect(self._run_playlist_search)
         search_row.addWidget(self.search_input)
         main_layout.addLayout(search_row)
 
@@ -145,9 +221,11 @@ class MusicPlayer(QMainWindow):
         main_layout.addLayout(now_row)
 
         content_row = QHBoxLayout()
-        self.playlist_box = QListWidget()
-        self.playlist_box.currentRowChanged.connect(self.on_song_select)
-        self.playlist_box.itemClicked.connect(self.on_song_clicked)
+        self.playlist_box = QListView()
+        self.playlist_box.setUniformItemSizes(True)
+        self.playlist_box.setModel(self.playlist_model)
+        self.playlist_box.selectionModel().currentRowChanged.connect(self.on_song_select)
+        self.playlist_box.clicked.connect(self.on_song_clicked)
         content_row.addWidget(self.playlist_box, 1)
 
         self.album_art_label = QLabel("No Art")
@@ -178,6 +256,7 @@ class MusicPlayer(QMainWindow):
         self.status_label.setFrameShadow(QFrame.Shadow.Raised)
         self.status_label.setLineWidth(1)
         status_row.addWidget(self.status_label)
+        self.status = StatusReporter(self.status_label, self)
         main_layout.addLayout(status_row)
 
         controls_row = QHBoxLayout()
@@ -214,15 +293,14 @@ class MusicPlayer(QMainWindow):
 
     def _bind_signals(self):
         self.status_update.connect(self.update_status)
+        self.audio.track_finished.connect(self._on_track_finished)
         self.download_button_state.connect(self._set_download_button_state)
-        self.download_clear_url.connect(self.url_input.clear)
-        self.reload_playlist_signal.connect(self.load_playlist)
-
-    def _start_playback_monitor(self):
-        self.playback_timer = QTimer(self)
-        self.playback_timer.setInterval(500)
-        self.playback_timer.timeout.connect(self._monitor_playback_tick)
-        self.playback_timer.start()
+        self.download_job_update.connect(self._on_download_job_update)
+        self.download_progress.connect(self._on_download_progress)
+        self.scan_batch.connect(self._on_scan_batch)
+        self.scan_finished.connect(self._on_scan_finished)
+        self.theme_catalog_ready.connect(self._on_theme_catalog_ready)
+        self.album_art.art_ready.connect(self._on_album_art_ready)
 
     def _load_initial_theme(self):
         config = load_config()
@@ -232,6 +310,63 @@ class MusicPlayer(QMainWindow):
                 return
         self.reset_theme(show_status=False)
 
+    def refresh_theme_catalog(self):
+        if self._catalog_refreshing:
+            return
+        self._catalog_refreshing = True
+        threading.Thread(target=self._theme_catalog_thread, daemon=True).start()
+
+    def _theme_catalog_thread(self):
+        changed = False
+        try:
+            changed = self.theme_manager.refresh_catalog()
+        except Exception as exc:
+            self.status_update.emit(f"Theme index failed: {str(exc)[:60]}...", "error")
+        self.theme_catalog_ready.emit(changed)
+
+    def _on_theme_catalog_ready(self, changed):
+        self._catalog_refreshing = False
+        if changed:
+            self._rebuild_themes_menu()
+
+    def _rebuild_themes_menu(self):
+        for action in self.theme_action_group.actions():
+            self.theme_action_group.removeAction(action)
+        self.themes_menu.clear()
+        entries = self.theme_manager.catalog()
+        if not entries:
+            empty_action = self.themes_menu.addAction("No themes found")
+            empty_action.setEnabled(False)
+            return
+        last_dir = entries[0]["dir"]
+        for entry in entries:
+            if entry["dir"] != last_dir:
+                self.themes_menu.addSeparator()
+                last_dir = entry["dir"]
+            action = QAction(entry["name"], self.themes_menu)
+            action.setData(entry["path"])
+            if entry["author"]:
+                action.setToolTip(f"{entry['name']} by {entry['author']}")
+            action.setCheckable(True)
+            action.setChecked(entry["path"] == self.current_theme_path)
+            action.triggered.connect(lambda checked=False, path=entry["path"]: self.apply_catalog_theme(path))
+            self.theme_action_group.addAction(action)
+            self.themes_menu.addAction(action)
+        self.themes_menu.setToolTipsVisible(True)
+
+    def _sync_theme_actions(self):
+        for action in self.theme_action_group.actions():
+            action.setChecked(action.data() == self.current_theme_path)
+
+    def apply_catalog_theme(self, theme_path):
+        entry = self.theme_manager.catalog_entry(theme_path)
+        if entry is None:
+            self.apply_theme_from_path(theme_path, persist=True)
+            return
+        # the parsed theme and its compiled sheet come from the index, so nothing is read from disk
+        self.apply_theme(copy.deepcopy(entry["theme"]), entry["path"], persist=True, qss=entry["qss"])
+        self.update_status(f"Theme loaded: {entry['name']} ({self.last_theme_apply_ms:.1f} ms)", "success")
+
     def choose_theme_file(self):
         start_dir = self.theme_manager.theme_dir
         selected, _ = QFileDialog.getOpenFileName(
@@ -250,11 +385,68 @@ class MusicPlayer(QMainWindow):
             return
         self.apply_theme_from_path(self.current_theme_path, persist=False)
 
+    def set_theme_hot_reload(self, enabled):
+        self.theme_hot_reload = enabled
+        config = load_config()
+        config["theme_hot_reload"] = enabled
+        save_config(config)
+        if enabled:
+            self._watch_theme_files()
+            self._theme_content_hash = hash_files(self._theme_watch_paths())
+            self.update_status("Live theme reload on", "info")
+        else:
+            self.theme_reload_timer.stop()
+            if self.theme_watcher.files():
+                self.theme_watcher.removePaths(self.theme_watcher.files())
+            self.update_status("Live theme reload off", "info")
+
+    def _theme_watch_paths(self):
+        paths = [self.current_theme_path] if self.current_theme_path else []
+        background = (self.theme or {}).get("images", {}).get("window_bg")
+        if background:
+            paths.append(background)
+        return paths
+
+    def _watch_theme_files(self):
+        # saving through a rename drops the file from the watcher, so the set is rebuilt every time
+        wanted = [path for path in self._theme_watch_paths() if os.path.isfile(path)]
+        stale = [path for path in self.theme_watcher.files() if path not in wanted]
+        if stale:
+            self.theme_watcher.removePaths(stale)
+        missing = [path for path in wanted if path not in self.theme_watcher.files()]
+        if missing:
+            self.theme_watcher.addPaths(missing)
+
+    def _on_theme_file_changed(self, path):
+        if self.theme_hot_reload:
+            self.theme_reload_timer.start()
+
+    def _hot_reload_theme(self):
+        if not self.theme_hot_reload or not self.current_theme_path:
+            return
+        self._watch_theme_files()
+        content_hash = hash_files(self._theme_watch_paths())
+        if content_hash == self._theme_content_hash:
+            return
+        # mtime can stay put across quick saves on coarse filesystems; the hash is what counts here
+        self.theme_manager.invalidate(self.current_theme_path)
+        try:
+            theme, theme_path = self.theme_manager.load_theme(self.current_theme_path)
+        except ThemeError as exc:
+            # half-written saves are common while editing, so this doesn't get a dialog
+            self.update_status(f"Theme reload failed: {exc}", "error")
+            return
+        self.apply_theme(theme, theme_path, persist=False)
+        self.update_status(
+            f"Theme reloaded: {theme['meta'].get('name', 'custom')} ({self.last_theme_apply_ms:.1f} ms)", "success"
+        )
+
     def reset_theme(self, show_status=True):
         theme, theme_path = self.theme_manager.load_default_theme()
         self.apply_theme(theme, theme_path, persist=True)
         if show_status:
-            self.update_status(f"Theme reset: {theme['meta'].get('name', 'default')}", "success")
+            name = theme["meta"].get("name", "default")
+            self.update_status(f"Theme reset: {name} ({self.last_theme_apply_ms:.1f} ms)", "success")
 
     def apply_theme_from_path(self, theme_path, persist=True):
         try:
@@ -265,66 +457,76 @@ class MusicPlayer(QMainWindow):
             return False
 
         self.apply_theme(theme, resolved_path, persist=persist)
-        self.update_status(f"Theme loaded: {theme['meta'].get('name', 'custom')}", "success")
+        name = theme["meta"].get("name", "custom")
+        self.update_status(f"Theme loaded: {name} ({self.last_theme_apply_ms:.1f} ms)", "success")
         return True
 
-    def apply_theme(self, theme, theme_path, persist=True):
+    def apply_theme(self, theme, theme_path, persist=True, qss=None):
+        started = time.perf_counter()
+        previous = self.theme or {}
         self.theme = theme
         self.current_theme_path = theme_path
-
-        m = theme["metrics"]
-        spacing = max(0, int(m.get("spacing", 8)))
-        padding = max(0, int(m.get("padding", 12)))
-        self.centralWidget().layout().setSpacing(spacing)
-        self.centralWidget().layout().setContentsMargins(padding, padding, padding, padding)
-
-        # fix for theming issue when newly loaded theme has a different size - LO
-        # unlock all size constraints first
-        self.setMinimumSize(0, 0)
-        self.setMaximumSize(16777215, 16777215)
-
-        new_w = max(640, m["window_width"])
-        new_h = max(480, m["window_height"])
-
-        # hide, resize, show, to force Qt to redraw the window
-        self.hide()
-        self.resize(new_w, new_h)
-        self.setFixedSize(new_w, new_h)
-
-        self.album_art_label.setMinimumSize(0, 0)
-        self.album_art_label.setMaximumSize(16777215, 16777215)
-        self.album_art_label.setFixedSize(
-            max(120, m["album_art_width"]),
-            max(120, m["album_art_height"]),
-        )
-
-        font_family = theme["typography"].get("font_family", "Courier New")
-        font_size = int(theme["typography"].get("font_size", 10))
-        self.setFont(QFont(font_family, font_size))
-
-        qss = self.theme_manager.build_stylesheet(theme)
-        self.setStyleSheet(qss)
-
-        self._apply_field_shadow(self.folder_label, theme["effects"].get("field_shadow", "sunken"))
-        self._apply_field_shadow(self.current_song_label, theme["effects"].get("field_shadow", "sunken"))
-        self._apply_field_shadow(self.status_label, theme["effects"].get("status_shadow", "raised"))
-
-        # forgot i need to rerender the album art 
-        if self.current_song_name and self.current_folder:
-            song_path = os.path.join(self.current_folder, self.current_song_name)
-            if os.path.isfile(song_path):
-                self.update_album_art(song_path)
-
-        # force full layout recalculation before showing
-        self.centralWidget().updateGeometry()
-        self.centralWidget().layout().activate()
-        QTimer.singleShot(0, self.show)
+        # only the sections that differ from the current theme are applied
+        changed = {key for key in theme if theme.get(key) != previous.get(key)}
+
+        if "metrics" in changed:
+            self._apply_metrics(theme["metrics"], previous.get("metrics") or {})
+
+        if "typography" in changed:
+            font_family = theme["typography"].get("font_family", "Courier New")
+            font_size = int(theme["typography"].get("font_size", 10))
+            self.setFont(QFont(font_family, font_size))
+
+        # compiled sheets are cached by theme hash, so switching back to a theme skips building it
+        if qss is None:
+            qss = self.theme_manager.stylesheet(theme)
+        if qss != self._applied_stylesheet:
+            # Qt re-parses and re-polishes on every setStyleSheet, even for an identical sheet
+            self.setStyleSheet(qss)
+            self._applied_stylesheet = qss
+
+        if "effects" in changed:
+            self._apply_field_shadow(self.folder_label, theme["effects"].get("field_shadow", "sunken"))
+            self._apply_field_shadow(self.current_song_label, theme["effects"].get("field_shadow", "sunken"))
+            self._apply_field_shadow(self.status_label, theme["effects"].get("status_shadow", "raised"))
 
         if persist:
             config = load_config()
             config["qt_theme_path"] = theme_path
             save_config(config)
-            
+        if self.theme_hot_reload:
+            self._watch_theme_files()
+            self._theme_content_hash = hash_files(self._theme_watch_paths())
+        self._sync_theme_actions()
+        self.last_theme_apply_ms = (time.perf_counter() - started) * 1000
+
+    def _apply_metrics(self, m, previous):
+        def differs(*keys):
+            return any(m.get(key) != previous.get(key) for key in keys)
+
+        if differs("spacing", "padding"):
+            spacing = max(0, int(m.get("spacing", 8)))
+            padding = max(0, int(m.get("padding", 12)))
+            self.centralWidget().layout().setSpacing(spacing)
+            self.centralWidget().layout().setContentsMargins(padding, padding, padding, padding)
+
+        if differs("window_width", "window_height"):
+            # the window is fixed-size, so constraints are unlocked before moving to the new size
+            new_w, new_h = self.theme_manager.window_size(self.theme)
+            self.setMinimumSize(0, 0)
+            self.setMaximumSize(16777215, 16777215)
+            self.resize(new_w, new_h)
+            self.setFixedSize(new_w, new_h)
+
+        if differs("album_art_width", "album_art_height"):
+            self.album_art_label.setMinimumSize(0, 0)
+            self.album_art_label.setMaximumSize(16777215, 16777215)
+            self.album_art_label.setFixedSize(
+                max(120, m["album_art_width"]),
+                max(120, m["album_art_height"]),
+            )
+            self._rescale_album_art()
+
     def _apply_field_shadow(self, widget, style):
         widget.setFrameShape(QFrame.Shape.Panel)
         widget.setLineWidth(1)
@@ -349,99 +551,99 @@ class MusicPlayer(QMainWindow):
         self.current_folder = folder
         self.folder_label.setText(folder)
         self.load_playlist()
-        if show_status:
-            self.update_status("Folder loaded successfully", "success")
         return True
 
     def update_status(self, message, level="default"):
-        palette = (self.theme or {}).get("palette", {})
-        if level == "error":
-            color = palette.get("status_error", "#b00020")
-        elif level == "success":
-            color = palette.get("status_success", "#1b5e20")
-        elif level == "info":
-            color = palette.get("status_info", "#0d47a1")
-        else:
-            color = palette.get("text", "#333333")
-        self.status_label.setText(message)
-        self.status_label.setStyleSheet(f"color: {color};")
+        self.status.post(message, level)
 
     def handle_playlist_search(self, value):
-        query = value.strip().lower()
-        if not query:
-            self.ui_playlist = self.playlist.copy()
+        # debounced: a burst of keystrokes runs a single search
+        self.search_timer.start()
+
+    def _run_playlist_search(self):
+        self.search_timer.stop()
+        selected = self._selected_track_id()
+        result = self.search_index.search(self.search_input.text())
+        if result is None:
+            self.playlist_model.set_order(range(self.playlist_model.track_count()))
         else:
-            self.ui_playlist = [song for song in self.playlist if query in song.lower()]
-        self._refresh_playlist_widget()
-
-    def _refresh_playlist_widget(self):
-        self.playlist_box.clear()
-        for song in self.ui_playlist:
-            self.playlist_box.addItem(QListWidgetItem(song))
-        if self.ui_playlist:
-            self.current_index = min(self.current_index, len(self.ui_playlist) - 1)
-            self.playlist_box.setCurrentRow(self.current_index)
+            self.playlist_model.set_order(result)
+        self._restore_selection(selected)
+
+    def _selected_track_id(self):
+        if self.current_index < self.playlist_model.rowCount():
+            return self.playlist_model.track_id_at(self.current_index)
+        return None
+
+    def _restore_selection(self, track_id):
+        row = self.playlist_model.row_of_track(track_id)
+        if row >= 0:
+            self.current_index = row
+        elif self.playlist_model.rowCount():
+            self.current_index = min(self.current_index, self.playlist_model.rowCount() - 1)
         else:
             self.current_index = 0
+            return
+        self._select_row(self.current_index)
+        # filtering and shuffling change what comes next
+        self._queue_next_track()
+
+    def _select_row(self, row):
+        self.playlist_box.setCurrentIndex(self.playlist_model.index(row, 0))
 
     def download_song(self):
-        url = self.url_input.text().strip()
-        if not url:
+        urls = self.url_input.text().split()
+        if not urls:
             QMessageBox.warning(self, "No URL", "Enter a valid URL")
             return
         if not self.current_folder:
             QMessageBox.warning(self, "No Folder", "Select a folder first")
             return
-        if self.is_downloading:
-            QMessageBox.information(self, "Download in Progress", "A download is already in progress")
+        self.downloads.submit(urls, self.current_folder)
+        self.url_input.clear()
+        self._update_download_progress()
+
+    def _on_download_job_update(self, job):
+        finished, total = self.downloads.progress()
+        prefix = f"[{finished}/{total}] " if total > 1 else ""
+        title = job.get("title") or job["url"]
+        if job["status"] == RUNNING and job.get("resume_bytes"):
+            resumed = format_bytes(job["resume_bytes"])
+            self.update_status(f"{prefix}Resuming: {title[:40]} from {resumed}...", "info")
+        elif job["status"] == RUNNING:
+            self.update_status(f"{prefix}Downloading: {title[:50]}...", "info")
+        elif job["status"] == CONVERTING:
+            self.update_status(f"{prefix}Converting: {title[:50]}...", "info")
+        elif job["status"] == DONE:
+            self.update_status(f"{prefix}Downloaded: {title[:40]}...", "success")
+            self._insert_downloaded(job.get("path"))
+        elif job["status"] == EXPANDED:
+            message = f"Queued {job.get('entries', 0)} tracks from {title[:40]}"
+            if job.get("skipped"):
+                message += f" ({job['skipped']} already downloaded)"
+            self.update_status(message, "info")
+        elif job["status"] == SKIPPED:
+            self.update_status(f"{prefix}Already downloaded: {title[:40]}", "info")
+        elif job["status"] == QUEUED and job.get("attempts"):
+            self.update_status(f"{prefix}Retrying ({job['attempts']}): {title[:40]}...", "info")
+        elif job["status"] == FAILED:
+            self.update_status(f"{prefix}{job['error']}", "error")
+        self._update_download_progress()
+
+    def _on_download_progress(self, batch):
+        # already coalesced to at most 10 updates a second by the queue
+        job_id, sample = list(batch.items())[-1]
+        job = self.downloads.job(job_id)
+        if job is None or job["status"] not in (RUNNING, CONVERTING):
             return
-        thread = threading.Thread(target=self._download_song_thread, args=(url,), daemon=True)
-        thread.start()
+        finished, total = self.downloads.progress()
+        prefix = f"[{finished}/{total}] " if total > 1 else ""
+        title = job.get("title") or job["url"]
+        self.update_status(f"{prefix}{title[:40]}: {describe_progress(sample)}", "info")
 
-    def _download_song_thread(self, url):
-        self.is_downloading = True
-        self.status_update.emit("Starting download...", "info")
-        self.download_button_state.emit(False, "Downloading...")
-        try:
-            ffmpeg_path = get_ffmpeg_path()
-            ydl_opts = {
-                "format": "bestaudio/best",
-                "postprocessors": [
-                    {"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "0"},
-                    {"key": "EmbedThumbnail"},
-                    {"key": "FFmpegMetadata", "add_metadata": True},
-                ],
-                "outtmpl": os.path.join(self.current_folder, "%(title)s.%(ext)s"),
-                "writethumbnail": True,
-                "quiet": True,
-                "no_warnings": True,
-            }
-            if ffmpeg_path:
-                ydl_opts["ffmpeg_location"] = ffmpeg_path
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                video_title = info.get("title", "Unknown")
-                self.status_update.emit(f"Downloading: {video_title[:50]}...", "info")
-                ydl.download([url])
-
-            self.status_update.emit(f"Downloaded: {video_title[:40]}...", "success")
-            self.download_clear_url.emit()
-            self.reload_playlist_signal.emit()
-        except Exception as exc:
-            error_msg = str(exc)
-            if "Video unavailable" in error_msg:
-                error_msg = "Video is unavailable or private"
-            elif "network" in error_msg.lower():
-                error_msg = "Network error"
-            elif "ffmpeg" in error_msg.lower():
-                error_msg = "Download failed: FFmpeg not found in PATH"
-            else:
-                error_msg = f"Download failed: {error_msg[:60]}..."
-            self.status_update.emit(error_msg, "error")
-        finally:
-            self.is_downloading = False
-            self.download_button_state.emit(True, "Download")
+    def _update_download_progress(self):
+        active = self.downloads.active_count()
+        self.download_button_state.emit(True, f"Download ({active})" if active else "Download")
 
     def _set_download_button_state(self, enabled, text):
         self.download_btn.setEnabled(enabled)
@@ -449,148 +651,355 @@ class MusicPlayer(QMainWindow):
 
     def load_playlist(self):
         self.search_input.clear()
+        self._cancel_scan()
         if not self.current_folder:
             return
-        mp3_files = glob.glob(os.path.join(self.current_folder, "*.mp3"))
-        self.playlist = [os.path.basename(path) for path in mp3_files]
-        self.ui_playlist = self.playlist.copy()
+        self.library_roots = self._library_roots()
+        self.playlist_model.clear()
+        self.search_index.clear()
         self.current_index = 0
-        self._refresh_playlist_widget()
-        if self.ui_playlist:
-            self.current_song_label.setText(f"Ready to play: {self.ui_playlist[0]}")
-            self.clear_album_art()
+        self.current_song_label.setText("None")
+        self.clear_album_art()
+
+        self._scan_generation += 1
+        self._scan_cancel = threading.Event()
+        self._scan_inserts = []
+        self.update_status("Scanning library...", "info")
+        thread = threading.Thread(
+            target=self._scan_library_thread,
+            args=(self._scan_generation, list(self.library_roots), self._scan_cancel),
+            daemon=True,
+        )
+        thread.start()
+
+    def _cancel_scan(self):
+        if self._scan_cancel is not None:
+            self._scan_cancel.set()
+            self._scan_cancel = None
+
+    def _scan_library_thread(self, generation, roots, cancel_event):
+        def emit_batch(batch):
+            if not cancel_event.is_set():
+                self.scan_batch.emit(generation, batch)
+
+        try:
+            tracks = self.library.scan(roots, on_batch=emit_batch, cancel_event=cancel_event)
+            if cancel_event.is_set():
+                return
+            # the full search index is built here so the GUI thread only swaps it in
+            names = [display_name(track.path, roots) for track in tracks]
+            index = SearchIndex()
+            index.add(search_text(track, name) for track, name in zip(tracks, names))
+        except Exception as exc:
+            self.status_update.emit(f"Library scan failed: {str(exc)[:60]}...", "error")
+            return
+        if not cancel_event.is_set():
+            self.scan_finished.emit(generation, [track.path for track in tracks], names, index)
+
+    def _on_scan_batch(self, generation, tracks):
+        # batches from a scan the user already replaced are dropped
+        if generation != self._scan_generation:
+            return
+        self._append_tracks(tracks)
+        self.update_status(f"Scanning library... {self.playlist_model.track_count()} tracks", "info")
+
+    def _append_tracks(self, tracks):
+        tracks = [track for track in tracks if self.playlist_model.track_id(track.path) is None]
+        if not tracks:
+            return
+        was_empty = not self.playlist_model.rowCount()
+        names = [self._display_name(track.path) for track in tracks]
+        self.search_index.add(search_text(track, name) for track, name in zip(tracks, names))
+        query = self.search_input.text()
+        visible = (lambda track_id: self.search_index.matches(track_id, query)) if query.strip() else None
+        self.playlist_model.append_tracks([track.path for track in tracks], names, visible)
+        if was_empty and self.playlist_model.rowCount():
+            self._select_row(0)
+            self.current_song_label.setText(f"Ready to play: {self.playlist_model.name_at(0)}")
+        else:
+            # the track after the playing one may be new
+            self._queue_next_track()
+
+    def _insert_downloaded(self, path):
+        # a finished download joins the playlist in place; selection, filter and playback are left alone
+        if not path or not path.lower().endswith(AUDIO_EXTENSIONS):
+            return
+        path = os.path.abspath(path)
+        if not any(path.startswith(os.path.join(root, "")) for root in self.library_roots):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        tracks = self.library.sync([(path, stat.st_size, stat.st_mtime_ns)])
+        if self._scan_cancel is not None:
+            # a running scan swaps in its own track list when it finishes, so re-add afterwards
+            self._scan_inserts.extend(tracks)
+        self._append_tracks(tracks)
+
+    def _on_scan_finished(self, generation, paths, names, index):
+        if generation != self._scan_generation:
+            return
+        self._scan_cancel = None
+        selected = None
+        if self.current_index < self.playlist_model.rowCount():
+            selected = self.playlist_model.path_at(self.current_index)
+        # the finished scan replaces the arrival order with the sorted one
+        self.playlist_model.set_tracks(paths, names)
+        self.search_index = index
+        self._run_playlist_search()
+        inserts, self._scan_inserts = self._scan_inserts, []
+        self._append_tracks(inserts)
+        self._restore_selection(self.playlist_model.track_id(selected))
+        paths = self.playlist_model.paths()
+        if paths:
+            self.update_status(f"Loaded {len(paths)} tracks", "success")
         else:
             self.current_song_label.setText("None")
-            self.clear_album_art()
-            self.update_status("No MP3 files found in selected folder", "info")
+            self.update_status("No MP3 files found in library folders", "info")
+
+    def _library_roots(self):
+        roots = []
+        candidates = [self.current_folder] + list(load_config().get("library_roots", []))
+        for root in candidates:
+            if not root:
+                continue
+            root = os.path.abspath(os.path.expanduser(root))
+            if os.path.isdir(root) and root not in roots:
+                roots.append(root)
+        return roots
+
+    def _display_name(self, path):
+        return display_name(path, self.library_roots)
 
     def toggle_play(self):
-        if not self.ui_playlist:
+        if not self.playlist_model.rowCount():
             QMessageBox.warning(self, "No Music", "No songs in queue")
             return
         if self.is_playing:
             if self.is_paused:
-                pygame.mixer.music.unpause()
+                self.audio.resume()
                 self.is_paused = False
+                if self._paused_at is not None:
+                    self._paused_total += time.monotonic() - self._paused_at
+                    self._paused_at = None
                 self.play_btn.setText("Pause")
             else:
-                pygame.mixer.music.pause()
+                self.audio.pause()
                 self.is_paused = True
+                self._paused_at = time.monotonic()
                 self.play_btn.setText("Play")
         else:
             self.play_current_song()
 
-    def play_current_song(self):
-        if not self.ui_playlist or self.current_index >= len(self.ui_playlist):
+    def play_current_song(self, natural=False):
+        self._queued_path = None
+        if not self.playlist_model.rowCount() or self.current_index >= self.playlist_model.rowCount():
             self.is_playing = False
-            pygame.mixer.music.stop()
+            self.audio.stop()
             self.clear_album_art()
             return
 
-        song_path = os.path.join(self.current_folder, self.ui_playlist[self.current_index])
+        song_path = self.playlist_model.path_at(self.current_index)
         try:
-            pygame.mixer.music.load(song_path)
-            pygame.mixer.music.play()
+            self.audio.load(song_path)
+            self.audio.play()
             self.is_playing = True
             self.is_paused = False
             self.play_btn.setText("Pause")
-            self.current_song_name = self.ui_playlist[self.current_index]
-            self.current_song_label.setText(self.current_song_name)
-            self.playlist_box.setCurrentRow(self.current_index)
-            self.update_album_art(song_path)
+            self._on_track_started(song_path, time.monotonic(), natural)
         except Exception as exc:
             QMessageBox.critical(self, "Playback Error", f"Couldn't play {song_path}\nError: {exc}")
             self.is_playing = False
+            self.audio.stop()
             self.clear_album_art()
 
+    def _on_track_started(self, song_path, started_at, natural):
+        if natural:
+            self._report_gap(started_at)
+        self._track_started_at = started_at
+        self._track_length = self.audio.duration() or read_duration(song_path)
+        self._paused_at = None
+        self._paused_total = 0.0
+        self.current_song_path = song_path
+        self.current_song_name = self._display_name(song_path)
+        self.current_song_label.setText(self.current_song_name)
+        self._select_row(self.current_index)
+        self.update_album_art(song_path)
+        self._queue_next_track()
+
+    def _report_gap(self, started_at):
+        if self._track_started_at is None or not self._track_length:
+            return
+        expected_end = self._track_started_at + self._paused_total + self._track_length
+        self.last_gap_ms = max(0.0, (started_at - expected_end) * 1000)
+        mode = "gapless" if self.gapless else "reload"
+        self.update_status(f"Track gap: {self.last_gap_ms:.0f} ms ({mode})", "info")
+
+    def set_gapless(self, enabled):
+        self.gapless = bool(enabled)
+        config = load_config()
+        config["gapless_playback"] = self.gapless
+        save_config(config)
+        # a track that is already queued can't be dropped, so turning gapless off
+        # only takes effect from the track after it
+        if self.gapless:
+            self._queue_next_track()
+
+    def _queue_next_track(self):
+        if not self.gapless or not self.is_playing or not self.playlist_model.rowCount():
+            return
+        next_row = (self.current_index + 1) % self.playlist_model.rowCount()
+        next_path = self.playlist_model.path_at(next_row)
+        if next_path == self._queued_path:
+            return
+        self._queued_path = next_path if self.audio.queue(next_path) else None
+
+    def _advance_to_queued(self):
+        # the backend already switched to the queued file; only the UI has to catch up
+        started_at = time.monotonic() - self.audio.position()
+        song_path = self._queued_path
+        self._queued_path = None
+        row = self.playlist_model.row_of_path(song_path)
+        if row >= 0:
+            self.current_index = row
+        self._on_track_started(song_path, started_at, natural=True)
+
     def clear_album_art(self):
+        self._album_art_key = None
         self.album_art_label.setPixmap(QPixmap())
         self.album_art_label.setText("No Art")
 
     def update_album_art(self, song_path):
-        if not MUTAGEN_AVAILABLE or not PILLOW_AVAILABLE:
+        if not ALBUM_ART_AVAILABLE:
             self.album_art_label.setPixmap(QPixmap())
             self.album_art_label.setText("Libs Missing")
             return
 
-        try:
-            audio = MP3(song_path, ID3=ID3)
-            if not audio.tags:
-                self.clear_album_art()
-                return
+        target = self.album_art_label.size()
+        target_size = (max(1, target.width()), max(1, target.height()))
+        # decoding happens on the loader's pool; the result comes back through art_ready
+        self._album_art_key = self.album_art.make_key(song_path, target_size)
+        self.album_art.request(self._album_art_key)
 
-            for key, value in audio.tags.items():
-                if key.startswith("APIC"):
-                    img = Image.open(io.BytesIO(value.data))
-                    target = self.album_art_label.size()
-                    target_size = (max(1, target.width()), max(1, target.height()))
-                    img = ImageOps.fit(img, target_size, Image.Resampling.LANCZOS)
-                    buffer = io.BytesIO()
-                    img.save(buffer, format="PNG")
-                    image_data = buffer.getvalue()
-
-                    qimage = QImage.fromData(image_data, "PNG")
-                    pixmap = QPixmap.fromImage(qimage)
-                    self.album_art_label.setText("")
-                    self.album_art_label.setPixmap(pixmap)
-                    return
-            self.clear_album_art()
-        except Exception:
+    def _rescale_album_art(self):
+        if self._album_art_key is None or not ALBUM_ART_AVAILABLE:
+            return
+        target = self.album_art_label.size()
+        key = self.album_art.make_key(self._album_art_key[0], (max(1, target.width()), max(1, target.height())))
+        self._album_art_key = key
+        # scaled from art already in memory; only a larger size than anything cached goes back to the decoder
+        pixmap = self.album_art.rescale(key)
+        if pixmap is not None:
+            self.album_art_label.setPixmap(pixmap)
+        self.album_art.request(key)
+
+    def _on_album_art_ready(self, key, pixmap):
+        if key != self._album_art_key:
+            return
+        if pixmap is None:
             self.clear_album_art()
+            return
+        self.album_art_label.setText("")
+        self.album_art_label.setPixmap(pixmap)
 
-    def next_song(self):
-        if not self.ui_playlist:
+    def next_song(self, natural=False):
+        if not self.playlist_model.rowCount():
             return
-        self.current_index = (self.current_index + 1) % len(self.ui_playlist)
+        self.current_index = (self.current_index + 1) % self.playlist_model.rowCount()
         if self.is_playing or self.is_paused:
-            self.play_current_song()
+            self.play_current_song(natural=natural)
         else:
-            self.playlist_box.setCurrentRow(self.current_index)
-            self.current_song_label.setText(f"Ready: {self.ui_playlist[self.current_index]}")
+            self._select_row(self.current_index)
+            self.current_song_label.setText(f"Ready: {self.playlist_model.name_at(self.current_index)}")
 
     def previous_song(self):
-        if not self.ui_playlist:
+        if not self.playlist_model.rowCount():
             return
-        self.current_index = (self.current_index - 1 + len(self.ui_playlist)) % len(self.ui_playlist)
+        self.current_index = (self.current_index - 1 + self.playlist_model.rowCount()) % self.playlist_model.rowCount()
         if self.is_playing or self.is_paused:
             self.play_current_song()
         else:
-            self.playlist_box.setCurrentRow(self.current_index)
-            self.current_song_label.setText(f"Ready: {self.ui_playlist[self.current_index]}")
+            self._select_row(self.current_index)
+            self.current_song_label.setText(f"Ready: {self.playlist_model.name_at(self.current_index)}")
 
     def shuffle_playlist(self):
-        if not self.ui_playlist:
+        if not self.playlist_model.rowCount():
             QMessageBox.warning(self, "No Playlist", "Load songs first")
             return
-        current_song = self.ui_playlist[self.current_index] if self.current_index < len(self.ui_playlist) else None
-        random.shuffle(self.ui_playlist)
-        self._refresh_playlist_widget()
-        if current_song and current_song in self.ui_playlist:
-            self.current_index = self.ui_playlist.index(current_song)
-            self.playlist_box.setCurrentRow(self.current_index)
+        selected = self._selected_track_id()
+        order = list(self.playlist_model.order())
+        random.shuffle(order)
+        self.playlist_model.set_order(order)
+        self._restore_selection(selected)
         self.update_status("Playlist shuffled", "success")
 
-    def on_song_select(self, row):
-        if row < 0 or row >= len(self.ui_playlist):
+    def on_song_select(self, current, previous=None):
+        row = current.row()
+        if row < 0 or row >= self.playlist_model.rowCount():
             return
         self.current_index = row
         if not self.is_playing and not self.is_paused:
-            self.current_song_label.setText(f"Ready: {self.ui_playlist[row]}")
+            self.current_song_label.setText(f"Ready: {self.playlist_model.name_at(row)}")
+        else:
+            self._queue_next_track()
 
-    def on_song_clicked(self, item):
-        row = self.playlist_box.row(item)
-        if row < 0 or row >= len(self.ui_playlist):
+    def on_song_clicked(self, index):
+        row = index.row()
+        if row < 0 or row >= self.playlist_model.rowCount():
             return
         self.current_index = row
         self.play_current_song()
 
     def set_volume(self, value):
-        pygame.mixer.music.set_volume(int(value) / 100.0)
+        self.audio.set_volume(int(value) / 100.0)
+
+    def _on_track_finished(self, advanced):
+        if not self.is_playing or self.is_paused:
+            return
+        if advanced and self._queued_path:
+            self._advance_to_queued()
+        else:
+            self.next_song(natural=True)
+
+    def set_audio_backend(self, name):
+        if name == self.audio.name:
+            return
+        if name not in BACKENDS:
+            self.update_status(f"Unknown audio backend: {name}", "error")
+            self._sync_backend_actions()
+            return
+        try:
+            backend = BACKENDS[name](self)
+        except AudioBackendError as exc:
+            # the group already moved the check to the failed backend; put it back on the one still playing
+            self.update_status(f"Audio backend unavailable: {exc}", "error")
+            self._sync_backend_actions()
+            return
+        self.audio.stop()
+        self.audio.shutdown()
+        self.audio.deleteLater()
+        self.audio = backend
+        self.audio.track_finished.connect(self._on_track_finished)
+        self.audio.set_volume(self.volume_slider.value() / 100.0)
+        self.is_playing = False
+        self.is_paused = False
+        self._queued_path = None
+        self.play_btn.setText("Play")
+        config = load_config()
+        config["audio_backend"] = backend.name
+        save_config(config)
+        self._sync_backend_actions()
+        self.update_status(f"Audio backend: {backend.label}", "success")
 
-    def _monitor_playback_tick(self):
-        if self.is_playing and not self.is_paused and not pygame.mixer.music.get_busy():
-            self.next_song()
+    def _sync_backend_actions(self):
+        for action in self.backend_action_group.actions():
+            action.setChecked(action.data() == self.audio.name)
 
     def closeEvent(self, event):
-        pygame.mixer.quit()
+        self._cancel_scan()
+        self.downloads.shutdown()
+        self.album_art.shutdown()
+        self.audio.shutdown()
+        self.library.close()
         super().closeEvent(event)
\ No newline at end of file
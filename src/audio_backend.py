@@ -0,0 +1,313 @@
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+# pygame only posts the music end event once its video subsystem is up; nothing is drawn with it
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from PySide6.QtCore import QObject, Qt, QTimer, QUrl, Signal
+
+try:
+    import pygame
+
+    PYGAME_AVAILABLE = True
+except ImportError:
+    PYGAME_AVAILABLE = False
+
+try:
+    from PySide6.QtMultimedia import QAudioOutput, QMediaPlayer
+
+    QT_MULTIMEDIA_AVAILABLE = True
+except ImportError:
+    QT_MULTIMEDIA_AVAILABLE = False
+
+from library import read_duration
+
+DEFAULT_BACKEND = "pygame"
+
+# the end check wakes up shortly before the expected end, then polls tightly until the mixer reports it
+END_CHECK_LEAD_MS = 500
+END_CHECK_RETRY_MS = 20
+UNKNOWN_LENGTH_CHECK_MS = 500
+
+
+class AudioBackendError(Exception):
+    pass
+
+
+class AudioBackend(QObject):
+    # emitted once a track plays out; True when the backend already moved on to the queued track
+    track_finished = Signal(bool)
+
+    name = ""
+    label = ""
+
+    def load(self, path):
+        raise NotImplementedError
+
+    def play(self):
+        raise NotImplementedError
+
+    def pause(self):
+        raise NotImplementedError
+
+    def resume(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def seek(self, seconds):
+        raise NotImplementedError
+
+    def position(self):
+        raise NotImplementedError
+
+    def duration(self):
+        return None
+
+    def set_volume(self, volume):
+        raise NotImplementedError
+
+    def queue(self, path):
+        return False
+
+    def is_busy(self):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class PygameBackend(AudioBackend):
+    name = "pygame"
+    label = "pygame (SDL_mixer)"
+    END_EVENT = pygame.USEREVENT + 1 if PYGAME_AVAILABLE else None
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        if not PYGAME_AVAILABLE:
+            raise AudioBackendError("pygame is not installed")
+        pygame.mixer.init()
+        pygame.display.init()
+        pygame.mixer.music.set_endevent(self.END_EVENT)
+        self._length = None
+        self._queued = None
+        self._queued_length = None
+        self._offset = 0.0
+        self._playing = False
+        self._paused = False
+        # single-shot and only armed while something is playing, so paused or stopped costs no wakeups
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.timeout.connect(self._check_end)
+
+    def load(self, path):
+        try:
+            pygame.mixer.music.load(path)
+        except pygame.error as exc:
+            raise AudioBackendError(str(exc)) from exc
+        self._length = read_duration(path)
+        self._queued = None
+        self._offset = 0.0
+
+    def play(self):
+        pygame.mixer.music.play()
+        pygame.event.clear(self.END_EVENT)
+        self._playing = True
+        self._paused = False
+        self._schedule_end_check()
+
+    def pause(self):
+        pygame.mixer.music.pause()
+        self._paused = True
+        self._timer.stop()
+
+    def resume(self):
+        pygame.mixer.music.unpause()
+        self._paused = False
+        self._schedule_end_check()
+
+    def stop(self):
+        pygame.mixer.music.stop()
+        pygame.event.clear(self.END_EVENT)
+        self._playing = False
+        self._paused = False
+        self._queued = None
+        self._timer.stop()
+
+    def seek(self, seconds):
+        try:
+            pygame.mixer.music.set_pos(seconds)
+        except pygame.error as exc:
+            raise AudioBackendError(str(exc)) from exc
+        # get_pos keeps counting from play(), so remember where the seek moved us
+        self._offset = seconds - max(0, pygame.mixer.music.get_pos()) / 1000
+        self._schedule_end_check()
+
+    def position(self):
+        return self._offset + max(0, pygame.mixer.music.get_pos()) / 1000
+
+    def duration(self):
+        return self._length
+
+    def set_volume(self, volume):
+        pygame.mixer.music.set_volume(volume)
+
+    def queue(self, path):
+        try:
+            pygame.mixer.music.queue(path)
+        except pygame.error:
+            self._queued = None
+            return False
+        self._queued = path
+        self._queued_length = read_duration(path)
+        return True
+
+    def is_busy(self):
+        return pygame.mixer.music.get_busy()
+
+    def shutdown(self):
+        self._timer.stop()
+        pygame.mixer.quit()
+        pygame.display.quit()
+
+    def _schedule_end_check(self):
+        if not self._playing or self._paused:
+            self._timer.stop()
+            return
+        if self._length:
+            remaining_ms = (self._length - self.position()) * 1000
+            delay = max(END_CHECK_RETRY_MS, remaining_ms - END_CHECK_LEAD_MS)
+        else:
+            delay = UNKNOWN_LENGTH_CHECK_MS
+        self._timer.start(int(delay))
+
+    def _check_end(self):
+        ended = pygame.event.get(self.END_EVENT)
+        pygame.event.clear()
+        if not self._playing or self._paused:
+            return
+        if ended and self._queued and pygame.mixer.music.get_busy():
+            self._length = self._queued_length
+            self._queued = None
+            self._offset = 0.0
+            self._schedule_end_check()
+            self.track_finished.emit(True)
+        elif not pygame.mixer.music.get_busy():
+            self._playing = False
+            self.track_finished.emit(False)
+        else:
+            self._schedule_end_check()
+
+
+class QtMultimediaBackend(AudioBackend):
+    name = "qt"
+    label = "QtMultimedia"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        if not QT_MULTIMEDIA_AVAILABLE:
+            raise AudioBackendError("QtMultimedia is not available")
+        self._volume = 1.0
+        # a second player preloads the queued track so switching is just a play() call
+        self._player, self._output = self._create_player()
+        self._standby, self._standby_output = self._create_player()
+        self._queued = None
+
+    def _create_player(self):
+        player = QMediaPlayer(self)
+        output = QAudioOutput(self)
+        player.setAudioOutput(output)
+        player.mediaStatusChanged.connect(lambda status, source=player: self._on_status(source, status))
+        return player, output
+
+    def load(self, path):
+        self._player.setSource(QUrl.fromLocalFile(path))
+        if self._player.error() != QMediaPlayer.Error.NoError:
+            raise AudioBackendError(self._player.errorString())
+        self._clear_queue()
+
+    def play(self):
+        self._player.play()
+
+    def pause(self):
+        self._player.pause()
+
+    def resume(self):
+        self._player.play()
+
+    def stop(self):
+        self._player.stop()
+        self._clear_queue()
+
+    def seek(self, seconds):
+        self._player.setPosition(int(seconds * 1000))
+
+    def position(self):
+        return self._player.position() / 1000
+
+    def duration(self):
+        duration_ms = self._player.duration()
+        return duration_ms / 1000 if duration_ms > 0 else None
+
+    def set_volume(self, volume):
+        self._volume = volume
+        self._output.setVolume(volume)
+        self._standby_output.setVolume(volume)
+
+    def queue(self, path):
+        self._standby.setSource(QUrl.fromLocalFile(path))
+        self._queued = path
+        return True
+
+    def is_busy(self):
+        return self._player.playbackState() == QMediaPlayer.PlaybackState.PlayingState
+
+    def shutdown(self):
+        self._player.stop()
+        self._standby.stop()
+
+    def _clear_queue(self):
+        if self._queued:
+            self._standby.setSource(QUrl())
+            self._queued = None
+
+    def _on_status(self, player, status):
+        if player is not self._player or status != QMediaPlayer.MediaStatus.EndOfMedia:
+            return
+        if self._queued:
+            self._player, self._standby = self._standby, self._player
+            self._output, self._standby_output = self._standby_output, self._output
+            self._player.play()
+            self._queued = None
+            self.track_finished.emit(True)
+        else:
+            self.track_finished.emit(False)
+
+
+BACKENDS = {
+    PygameBackend.name: PygameBackend,
+    QtMultimediaBackend.name: QtMultimediaBackend,
+}
+
+
+def available_backends():
+    names = []
+    if PYGAME_AVAILABLE:
+        names.append(PygameBackend.name)
+    if QT_MULTIMEDIA_AVAILABLE:
+        names.append(QtMultimediaBackend.name)
+    return names
+
+
+def create_backend(name=None, parent=None):
+    candidates = [name] if name in BACKENDS else []
+    candidates += [backend for backend in available_backends() if backend not in candidates]
+    errors = []
+    for candidate in candidates:
+        try:
+            return BACKENDS[candidate](parent)
+        except Exception as exc:
+            errors.append(f"{candidate}: {exc}")
+    raise AudioBackendError("No audio backend could be started (" + "; ".join(errors) + ")")
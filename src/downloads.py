@@ -0,0 +1,609 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import yt_dlp
+from yt_dlp.utils import DownloadCancelled, make_archive_id
+
+from utils import get_cache_dir, get_downloads_path, get_ffmpeg_path
+
+QUEUED = "queued"
+RUNNING = "running"
+CONVERTING = "converting"
+DONE = "done"
+FAILED = "failed"
+# already in the download archive, or the same audio as an earlier download
+SKIPPED = "skipped"
+# a playlist or channel job that was replaced by one job per entry
+EXPANDED = "expanded"
+ACTIVE = (QUEUED, RUNNING, CONVERTING)
+FINISHED = (DONE, FAILED, SKIPPED, EXPANDED)
+
+DEFAULT_WORKERS = 3
+DEFAULT_TRANSCODERS = os.cpu_count() or 2
+MAX_FINISHED_JOBS = 100
+MAX_RETRIES = 2
+RETRY_DELAY = 2.0
+HOST_MIN_INTERVAL = 0.5
+# progress reaches the UI and the metrics log at most this often, however fast the hooks fire
+PROGRESS_INTERVAL = 0.1
+METRICS_MAX_BYTES = 4 * 1024 * 1024
+
+PLAYLIST_TYPES = ("playlist", "multi_video")
+PERMANENT_ERRORS = ("unavailable", "private", "not a valid url", "unsupported url", "copyright")
+
+
+def describe_download_error(exc):
+    error_msg = str(exc)
+    if "Video unavailable" in error_msg:
+        return "Video is unavailable or private"
+    if "network" in error_msg.lower():
+        return "Network error"
+    if "ffmpeg" in error_msg.lower():
+        return "Download failed: FFmpeg not found in PATH"
+    return f"Download failed: {error_msg[:60]}..."
+
+
+def format_bytes(value):
+    for unit in ("B", "KiB", "MiB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GiB"
+
+
+def describe_progress(sample):
+    if sample.get("stage") != "download":
+        return f"{sample.get('stage')}..."
+    done = sample.get("downloaded_bytes") or 0
+    total = sample.get("total_bytes")
+    parts = [f"{done * 100 / total:.0f}% of {format_bytes(total)}" if total else format_bytes(done)]
+    if sample.get("speed"):
+        parts.append(f"{format_bytes(sample['speed'])}/s")
+    if sample.get("eta") is not None:
+        minutes, seconds = divmod(int(sample["eta"]), 60)
+        parts.append(f"{minutes}:{seconds:02d} left")
+    return ", ".join(parts)
+
+
+def is_retryable(exc):
+    error_msg = str(exc).lower()
+    return not any(marker in error_msg for marker in PERMANENT_ERRORS)
+
+
+def entry_url(entry):
+    if not isinstance(entry, dict):
+        return None
+    url = entry.get("url") or entry.get("webpage_url") or entry.get("original_url")
+    if url and "://" not in url and entry.get("ie_key"):
+        # some extractors hand back bare ids for their entries
+        return entry.get("webpage_url")
+    return url
+
+
+def archive_id_for(info):
+    extractor = info.get("extractor_key") or info.get("ie_key")
+    video_id = info.get("id")
+    if not extractor or not video_id:
+        return None
+    return make_archive_id(extractor, video_id)
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MetricsLog:
+    def __init__(self, path=None, max_bytes=METRICS_MAX_BYTES):
+        self.path = path or os.path.join(get_cache_dir(), "metrics", "downloads.jsonl")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def write(self, records):
+        if not records:
+            return
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+                with open(self.path, "a", encoding="utf-8") as handle:
+                    handle.write(lines)
+            except OSError:
+                pass
+
+
+class HostRateLimiter:
+    def __init__(self, min_interval=HOST_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        host = urlparse(url).hostname or ""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def ydl_params(ffmpeg_path=None, thumbnail=True):
+    params = {
+        "format": "bestaudio/best",
+        "outtmpl": "%(title)s.%(ext)s",
+        "writethumbnail": thumbnail,
+        # keep .part files and pick them up with a range request, even across restarts
+        "continuedl": True,
+        "quiet": True,
+        "no_warnings": True,
+    }
+    if ffmpeg_path:
+        params["ffmpeg_location"] = ffmpeg_path
+    return params
+
+
+def transcode_params(ffmpeg_path=None):
+    params = {
+        "postprocessors": [
+            {"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "0"},
+            {"key": "EmbedThumbnail"},
+            {"key": "FFmpegMetadata", "add_metadata": True},
+        ],
+        "quiet": True,
+        "no_warnings": True,
+    }
+    if ffmpeg_path:
+        params["ffmpeg_location"] = ffmpeg_path
+    return params
+
+
+class AudioDownloader:
+    def __init__(self, params=None, pp_params=None):
+        ffmpeg_path = get_ffmpeg_path()
+        self.params = params if params is not None else ydl_params(ffmpeg_path)
+        self.pp_params = pp_params if pp_params is not None else transcode_params(ffmpeg_path)
+        # YoutubeDL isn't thread safe, so each worker thread keeps its own instances across jobs
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._instances = []
+        self.cancel_event = threading.Event()
+
+    def create_ydl(self, params):
+        return yt_dlp.YoutubeDL(params)
+
+    def _ydl(self, stage="network"):
+        ydl = getattr(self._local, stage, None)
+        if ydl is None:
+            params = dict(self.pp_params if stage == "transcode" else self.params)
+            # hooks are per instance, so they look up the job this thread is working on
+            params["progress_hooks"] = [self._on_progress]
+            params["postprocessor_hooks"] = [self._on_postprocess]
+            ydl = self.create_ydl(params)
+            setattr(self._local, stage, ydl)
+            with self._lock:
+                self._instances.append(ydl)
+        return ydl
+
+    def resolve(self, job):
+        # resolve once without processing; playlists come back with their entries unextracted
+        return self._ydl().extract_info(job["url"], download=False, process=False)
+
+    def _on_progress(self, status):
+        if self.cancel_event.is_set():
+            # stops the transfer between chunks and leaves the .part file for the next launch
+            raise DownloadCancelled()
+        report = getattr(self._local, "report", None)
+        if report is None:
+            return
+        report({
+            "stage": "download",
+            "part": status.get("tmpfilename"),
+            "downloaded_bytes": status.get("downloaded_bytes"),
+            "total_bytes": status.get("total_bytes") or status.get("total_bytes_estimate"),
+            "speed": status.get("speed"),
+            "eta": status.get("eta"),
+            "force": status.get("status") != "downloading",
+        })
+
+    def _on_postprocess(self, status):
+        # the network stage still runs yt-dlp's internal file moves; only conversion steps are reported
+        report = getattr(self._local, "report", None) if getattr(self._local, "transcoding", False) else None
+        if report is not None and status.get("status") == "started":
+            report({"stage": status.get("postprocessor"), "force": True})
+
+    def fetch(self, job, info, report=None):
+        # network only: the raw audio and thumbnail land on disk, conversion happens in transcode()
+        ydl = self._ydl()
+        ydl.params["paths"] = {"home": job["folder"]}
+        self._local.report = report
+        try:
+            info = ydl.process_ie_result(info, download=True)
+        finally:
+            self._local.report = None
+        downloads = info.get("requested_downloads")
+        if downloads:
+            return downloads[-1]
+        return dict(info, filepath=ydl.prepare_filename(info))
+
+    def transcode(self, info, report=None):
+        ydl = self._ydl("transcode")
+        info = dict(info)
+        info["__files_to_move"] = {}
+        self._local.report = report
+        self._local.transcoding = True
+        try:
+            info = ydl.run_all_pps("post_process", info)
+        finally:
+            self._local.report = None
+            self._local.transcoding = False
+        info.pop("__files_to_move", None)
+        return info["filepath"]
+
+    def download(self, job, report):
+        info = self.resolve(job)
+        title = info.get("title") or "Unknown"
+        report(title=title)
+        return title, self.transcode(self.fetch(job, info))
+
+    def close(self):
+        self.cancel_event.set()
+        with self._lock:
+            instances, self._instances = self._instances, []
+        for ydl in instances:
+            try:
+                ydl.close()
+            except Exception:
+                pass
+
+
+class DownloadQueue:
+    def __init__(
+        self,
+        on_job_update=None,
+        on_progress=None,
+        max_workers=DEFAULT_WORKERS,
+        transcode_workers=DEFAULT_TRANSCODERS,
+        path=None,
+        downloader=None,
+        archive=None,
+        max_retries=MAX_RETRIES,
+        host_interval=HOST_MIN_INTERVAL,
+    ):
+        self.path = path or get_downloads_path()
+        self.on_job_update = on_job_update
+        self.on_progress = on_progress
+        self.metrics = MetricsLog()
+        self.downloader = downloader or AudioDownloader()
+        self.archive = archive
+        self.max_retries = max_retries
+        self.rate_limiter = HostRateLimiter(host_interval)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._jobs = self._load()
+        self._batch = set()
+        self._inflight = {}
+        self._waiting = {}
+        self._progress_lock = threading.Lock()
+        self._pending_progress = {}
+        self._last_progress = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="download")
+        # ffmpeg does the CPU work in its own process, so a thread per core is enough to keep every core busy
+        self._transcoder = ThreadPoolExecutor(max_workers=max(1, int(transcode_workers)), thread_name_prefix="transcode")
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                jobs = json.load(handle).get("jobs", [])
+        except (OSError, ValueError, AttributeError):
+            return {}
+        return {job["id"]: job for job in jobs if isinstance(job, dict) and job.get("id") and job.get("url")}
+
+    def _save(self):
+        finished = [job for job in self._jobs.values() if job["status"] in FINISHED]
+        for job in finished[:-MAX_FINISHED_JOBS]:
+            del self._jobs[job["id"]]
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump({"jobs": list(self._jobs.values())}, handle, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def progress(self):
+        with self._lock:
+            batch = [
+                self._jobs[job_id]
+                for job_id in self._batch
+                if job_id in self._jobs and self._jobs[job_id]["status"] != EXPANDED
+            ]
+        finished = sum(1 for job in batch if job["status"] not in ACTIVE)
+        return finished, len(batch)
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] in ACTIVE)
+
+    def submit(self, urls, folder):
+        with self._lock:
+            # the N/M counter starts over once everything submitted earlier has finished
+            if not any(self._jobs[job_id]["status"] in ACTIVE for job_id in self._batch if job_id in self._jobs):
+                self._batch.clear()
+            created = self._add_jobs(urls, folder)
+            self._save()
+        for job in created:
+            self._schedule(job["id"])
+        return created
+
+    def _add_jobs(self, urls, folder, parent=None):
+        created = []
+        for url in urls:
+            job = {
+                "id": uuid.uuid4().hex,
+                "url": url,
+                "folder": folder,
+                "status": QUEUED,
+                "title": "",
+                "error": "",
+                "path": "",
+                "parent": parent,
+                "attempts": 0,
+                "created": time.time(),
+                "updated": time.time(),
+            }
+            self._jobs[job["id"]] = job
+            self._batch.add(job["id"])
+            created.append(dict(job))
+        return created
+
+    def _schedule(self, job_id, delay=0):
+        if self._closed:
+            return
+        if delay:
+            timer = threading.Timer(delay, self._schedule, args=(job_id,))
+            timer.daemon = True
+            timer.start()
+            return
+        try:
+            self._executor.submit(self._run, job_id)
+        except RuntimeError:
+            # the pool is already shut down; the job stays queued for the next launch
+            pass
+
+    def resume_pending(self):
+        # jobs that were queued or cut off when the app last closed are picked up again
+        with self._lock:
+            pending = [job for job in self._jobs.values() if job["status"] in ACTIVE]
+            for job in pending:
+                job["status"] = QUEUED
+                self._batch.add(job["id"])
+            if pending:
+                self._save()
+        for job in pending:
+            self._schedule(job["id"])
+        return len(pending)
+
+    def shutdown(self):
+        self._closed = True
+        # transfers stop at their next progress hook and keep their .part file; conversions already
+        # running are waited for so their DONE status and archive row land before the library closes
+        self.downloader.cancel_event.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._transcoder.shutdown(wait=True, cancel_futures=True)
+        self.downloader.close()
+
+    def _run(self, job_id):
+        with self._lock:
+            queued = job_id in self._jobs and self._jobs[job_id]["status"] == QUEUED
+        if not queued:
+            return
+        with self._lock:
+            part = self._jobs[job_id].get("part")
+        resume_bytes = os.path.getsize(part) if part and os.path.isfile(part) else 0
+        job = self._update(job_id, status=RUNNING, resume_bytes=resume_bytes)
+        try:
+            self.rate_limiter.wait(job["url"])
+            info = self.downloader.resolve(job)
+            title = info.get("title") or "Unknown"
+            if info.get("_type") in PLAYLIST_TYPES:
+                self._expand(job_id, title, info)
+                return
+            # nothing but metadata has been fetched so far, so a repeat costs one resolve at most
+            archive_id = archive_id_for(info)
+            self._update(job_id, title=title, archive_id=archive_id)
+            existing = self._claim(job_id, archive_id)
+            if existing:
+                self._finish(job_id, status=SKIPPED, path=existing, error="")
+                return
+            if existing is not None:
+                # another job is fetching the same track; _finish settles this one once that job does
+                return
+            downloaded = self.downloader.fetch(job, info, lambda sample: self._progress(job_id, sample))
+        except Exception as exc:
+            if self._closed and isinstance(exc, DownloadCancelled):
+                # transfer cut off by shutdown: the job stays running on disk and resumes on the next launch
+                return
+            self._fail(job_id, exc)
+            return
+        # hand off to the transcode pool so this worker can start on the next download
+        self._update(job_id, status=CONVERTING)
+        try:
+            self._transcoder.submit(self._transcode, job_id, title, archive_id, downloaded)
+        except RuntimeError:
+            pass
+
+    def _transcode(self, job_id, title, archive_id, downloaded):
+        try:
+            content_hash = hash_file(downloaded["filepath"])
+            existing = self._content_duplicate(content_hash)
+            if existing:
+                # a mirror of something already in the library: drop the raw files instead of converting them,
+                # and archive its id so submitting this url again is skipped before anything is fetched
+                self._remove_raw(downloaded)
+                if self.archive is not None and archive_id:
+                    self.archive.add_to_archive(archive_id, content_hash, existing)
+                self._finish(job_id, status=SKIPPED, title=title, path=existing, error="")
+                return
+            path = self.downloader.transcode(downloaded, lambda sample: self._progress(job_id, sample))
+            if self.archive is not None and archive_id:
+                self.archive.add_to_archive(archive_id, content_hash, path)
+        except Exception as exc:
+            self._finish(job_id, status=FAILED, error=describe_download_error(exc))
+        else:
+            self._finish(job_id, status=DONE, title=title, path=path, part="", error="")
+
+    def _claim(self, job_id, archive_id):
+        if not archive_id:
+            return None
+        if self.archive is not None:
+            path = self.archive.archived_path(archive_id)
+            if path and os.path.isfile(path):
+                return path
+            if path:
+                # the earlier download was deleted from disk, so it may be fetched again
+                self.archive.forget_download(archive_id)
+        with self._lock:
+            owner = self._inflight.setdefault(archive_id, job_id)
+            if owner == job_id:
+                return None
+            self._waiting.setdefault(archive_id, []).append(job_id)
+        return ""
+
+    def _content_duplicate(self, content_hash):
+        if self.archive is None:
+            return None
+        for path in self.archive.path_for_content(content_hash):
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _remove_raw(self, downloaded):
+        paths = [downloaded.get("filepath")]
+        paths += [thumb.get("filepath") for thumb in downloaded.get("thumbnails") or []]
+        for path in paths:
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _finish(self, job_id, **fields):
+        waiters = []
+        with self._lock:
+            for archive_id, owner in list(self._inflight.items()):
+                if owner == job_id:
+                    del self._inflight[archive_id]
+                    waiters += self._waiting.pop(archive_id, [])
+        snapshot = self._update(job_id, **fields)
+        for waiter in waiters:
+            if snapshot and snapshot["status"] in (DONE, SKIPPED) and snapshot["path"]:
+                self._finish(waiter, status=SKIPPED, path=snapshot["path"], error="")
+            else:
+                # the owner failed, so the duplicate gets its own attempt rather than being dropped
+                self._update(waiter, status=QUEUED)
+                self._schedule(waiter)
+        return snapshot
+
+    def _expand(self, job_id, title, info):
+        urls = []
+        skipped = 0
+        for entry in info.get("entries") or []:
+            url = entry_url(entry)
+            if not url:
+                continue
+            archive_id = archive_id_for(entry)
+            if self.archive is not None and archive_id:
+                path = self.archive.archived_path(archive_id)
+                if path and os.path.isfile(path):
+                    skipped += 1
+                    continue
+            urls.append(url)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            # children and the parent's new status hit the disk together, so a restart can't lose or repeat entries
+            created = self._add_jobs(urls, job["folder"], parent=job_id)
+            job.update(status=EXPANDED, title=title, entries=len(created), skipped=skipped, updated=time.time())
+            snapshot = dict(job)
+            self._save()
+        if self.on_job_update:
+            self.on_job_update(snapshot)
+        for child in created:
+            self._schedule(child["id"])
+
+    def _fail(self, job_id, exc):
+        with self._lock:
+            attempts = self._jobs[job_id].get("attempts", 0) if job_id in self._jobs else 0
+        error = describe_download_error(exc)
+        if attempts < self.max_retries and is_retryable(exc) and not self._closed:
+            # only this entry goes back in the queue, with a growing delay
+            self._update(job_id, status=QUEUED, attempts=attempts + 1, error=error)
+            self._schedule(job_id, RETRY_DELAY * 2**attempts)
+        else:
+            self._finish(job_id, status=FAILED, error=error)
+
+    def _progress(self, job_id, sample):
+        # hooks can fire hundreds of times a second; keep the latest sample per job and flush them together
+        force = sample.pop("force", False)
+        part = sample.pop("part", None)
+        if part:
+            self._track_part(job_id, part)
+        now = time.monotonic()
+        with self._progress_lock:
+            self._pending_progress[job_id] = sample
+            if not force and now - self._last_progress < PROGRESS_INTERVAL:
+                return
+            self._last_progress = now
+            batch, self._pending_progress = self._pending_progress, {}
+        stamp = time.time()
+        self.metrics.write([dict(sample, event="progress", job=job_id, ts=stamp) for job_id, sample in batch.items()])
+        if self.on_progress:
+            self.on_progress(batch)
+
+    def _track_part(self, job_id, part):
+        # only the path is persisted; the byte count comes from the file itself on resume
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.get("part") == part:
+                return
+            job["part"] = part
+            self._save()
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            job["updated"] = time.time()
+            snapshot = dict(job)
+            self._save()
+        if "status" in fields:
+            self.metrics.write([{
+                "event": "status",
+                "job": job_id,
+                "ts": snapshot["updated"],
+                "status": snapshot["status"],
+                "url": snapshot["url"],
+                "elapsed": round(snapshot["updated"] - snapshot["created"], 3),
+                "attempts": snapshot.get("attempts", 0),
+            }])
+        if self.on_job_update:
+            self.on_job_update(snapshot)
+        return snapshot
@@ -0,0 +1,279 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    from mutagen import File as MutagenFile
+
+    MUTAGEN_AVAILABLE = True
+except ImportError:
+    MUTAGEN_AVAILABLE = False
+
+from utils import get_library_db_path
+
+AUDIO_EXTENSIONS = (".mp3",)
+
+Track = namedtuple("Track", ["path", "size", "mtime_ns", "title", "artist", "album"])
+
+
+def read_tags(path):
+    if not MUTAGEN_AVAILABLE:
+        return "", "", ""
+    try:
+        audio = MutagenFile(path, easy=True)
+    except Exception:
+        return "", "", ""
+    if audio is None or not audio.tags:
+        return "", "", ""
+
+    def first(key):
+        values = audio.tags.get(key) or [""]
+        return str(values[0])
+
+    return first("title"), first("artist"), first("album")
+
+
+def read_duration(path):
+    if not MUTAGEN_AVAILABLE:
+        return None
+    try:
+        audio = MutagenFile(path)
+    except Exception:
+        return None
+    if audio is None or not getattr(audio, "info", None):
+        return None
+    return audio.info.length or None
+
+
+def display_name(path, roots):
+    for root in roots:
+        if path.startswith(os.path.join(root, "")):
+            return os.path.relpath(path, root)
+    return os.path.basename(path)
+
+
+def search_text(track, name):
+    return " ".join(part for part in (name, track.title, track.artist, track.album) if part)
+
+
+class LibraryIndex:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or get_library_db_path()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tracks (
+                    path TEXT PRIMARY KEY,
+                    folder TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    title TEXT NOT NULL DEFAULT '',
+                    artist TEXT NOT NULL DEFAULT '',
+                    album TEXT NOT NULL DEFAULT ''
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS tracks_folder ON tracks(folder)")
+            # one row per finished download: the extractor/id pair yt-dlp uses for its own archive files
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS download_archive (
+                    archive_id TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL DEFAULT '',
+                    path TEXT NOT NULL,
+                    added REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS download_archive_hash ON download_archive(content_hash)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def sync(self, entries, executor=None):
+        if not entries:
+            return []
+        known = {}
+        paths = [entry[0] for entry in entries]
+        with self._lock:
+            for offset in range(0, len(paths), 500):
+                chunk = paths[offset:offset + 500]
+                rows = self._conn.execute(
+                    "SELECT path, size, mtime_ns, title, artist, album FROM tracks "
+                    f"WHERE path IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                known.update((row[0], Track(*row)) for row in rows)
+
+        tracks = []
+        stale = []
+        for path, size, mtime_ns in entries:
+            cached = known.get(path)
+            if cached and cached.size == size and cached.mtime_ns == mtime_ns:
+                tracks.append(cached)
+            else:
+                stale.append((path, size, mtime_ns))
+        if not stale:
+            return tracks
+
+        # only files whose stat changed get their tags parsed again
+        stale_paths = [entry[0] for entry in stale]
+        tags = executor.map(read_tags, stale_paths) if executor else map(read_tags, stale_paths)
+        changed = [Track(path, size, mtime_ns, *tag) for (path, size, mtime_ns), tag in zip(stale, tags)]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tracks (path, folder, size, mtime_ns, title, artist, album) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(t.path, os.path.dirname(t.path), t.size, t.mtime_ns, t.title, t.artist, t.album) for t in changed],
+            )
+        tracks.extend(changed)
+        return tracks
+
+    def prune(self, roots, seen_paths):
+        with self._lock:
+            rows = []
+            for root in roots:
+                prefix = os.path.join(os.path.abspath(root), "")
+                rows.extend(
+                    self._conn.execute(
+                        "SELECT path FROM tracks WHERE substr(path, 1, ?) = ?",
+                        (len(prefix), prefix),
+                    ).fetchall()
+                )
+        missing = [(row[0],) for row in rows if row[0] not in seen_paths]
+        if missing:
+            with self._lock, self._conn:
+                self._conn.executemany("DELETE FROM tracks WHERE path = ?", missing)
+        return len(missing)
+
+    def archived_path(self, archive_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM download_archive WHERE archive_id = ?", (archive_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def path_for_content(self, content_hash):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM download_archive WHERE content_hash = ?", (content_hash,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def add_to_archive(self, archive_id, content_hash, path):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO download_archive (archive_id, content_hash, path, added) VALUES (?, ?, ?, ?)",
+                (archive_id, content_hash, path, time.time()),
+            )
+
+    def forget_download(self, archive_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM download_archive WHERE archive_id = ?", (archive_id,))
+
+    def scan(self, roots, on_batch=None, cancel_event=None, max_workers=None):
+        roots = [os.path.abspath(root) for root in roots if root and os.path.isdir(root)]
+        scanner = LibraryScanner(roots, max_workers=max_workers)
+        tracks = []
+        seen = set()
+
+        with ThreadPoolExecutor(max_workers=4) as tag_executor:
+            def handle_batch(entries):
+                batch = self.sync(entries, executor=tag_executor)
+                seen.update(track.path for track in batch)
+                tracks.extend(batch)
+                if on_batch and batch:
+                    on_batch(batch)
+
+            completed = scanner.scan(handle_batch, cancel_event=cancel_event)
+
+        # a cancelled walk hasn't seen everything, so it can't tell what was deleted
+        if completed:
+            self.prune(roots, seen)
+        tracks.sort(key=lambda track: track.path.lower())
+        return tracks
+
+
+class LibraryScanner:
+    def __init__(self, roots, max_workers=None, batch_size=512, flush_interval=0.05):
+        self.roots = list(roots)
+        self.max_workers = max_workers or min(16, (os.cpu_count() or 1) + 4)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+    def scan(self, on_batch, cancel_event=None):
+        visited = set()
+        batch = []
+        first_flushed = False
+        last_flush = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = set()
+            for root in self.roots:
+                real = os.path.realpath(root)
+                if real in visited:
+                    continue
+                visited.add(real)
+                pending.add(executor.submit(_scan_directory, root))
+
+            while pending:
+                if cancel_event is not None and cancel_event.is_set():
+                    for future in pending:
+                        future.cancel()
+                    return False
+                done, pending = wait(pending, timeout=self.flush_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    batch.extend(files)
+                    for subdir in subdirs:
+                        real = os.path.realpath(subdir)
+                        if real in visited:
+                            continue
+                        visited.add(real)
+                        pending.add(executor.submit(_scan_directory, subdir))
+
+                now = time.monotonic()
+                # hand over the first files right away, then stream in larger batches
+                if batch and (
+                    not first_flushed
+                    or len(batch) >= self.batch_size
+                    or now - last_flush >= self.flush_interval
+                ):
+                    on_batch(batch)
+                    batch = []
+                    first_flushed = True
+                    last_flush = now
+
+        if batch:
+            on_batch(batch)
+        return True
+
+
+def _scan_directory(path):
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith("."):
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.name.lower().endswith(AUDIO_EXTENSIONS) or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+    except OSError:
+        pass
+    return files, subdirs
@@ -0,0 +1,104 @@
+from array import array
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+
+
+class PlaylistModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._paths = []
+        self._names = []
+        self._ids = {}
+        # visible rows, as ids into _paths/_names
+        self._order = array("I")
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._order)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._order):
+            return None
+        track_id = self._order[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._names[track_id]
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self._paths[track_id]
+        return None
+
+    def track_count(self):
+        return len(self._paths)
+
+    def paths(self):
+        return self._paths
+
+    def order(self):
+        return self._order
+
+    def path_at(self, row):
+        return self._paths[self._order[row]]
+
+    def name_at(self, row):
+        return self._names[self._order[row]]
+
+    def track_id_at(self, row):
+        return self._order[row]
+
+    def track_id(self, path):
+        return self._ids.get(path)
+
+    def row_of_track(self, track_id):
+        if track_id is None:
+            return -1
+        try:
+            return self._order.index(track_id)
+        except ValueError:
+            return -1
+
+    def row_of_path(self, path):
+        return self.row_of_track(self._ids.get(path))
+
+    def clear(self):
+        self.set_tracks([], [])
+
+    def set_tracks(self, paths, names, visible_ids=None):
+        self.beginResetModel()
+        self._paths = list(paths)
+        self._names = list(names)
+        self._ids = {path: track_id for track_id, path in enumerate(self._paths)}
+        if visible_ids is None:
+            self._order = array("I", range(len(self._paths)))
+        else:
+            self._order = array("I", visible_ids)
+        self.endResetModel()
+
+    def append_tracks(self, paths, names, visible=None):
+        start_id = len(self._paths)
+        self._paths.extend(paths)
+        self._names.extend(names)
+        for offset, path in enumerate(paths):
+            self._ids[path] = start_id + offset
+        new_ids = range(start_id, len(self._paths))
+        if visible is not None:
+            new_ids = [track_id for track_id in new_ids if visible(track_id)]
+        if not new_ids:
+            return
+        first = len(self._order)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_ids) - 1)
+        self._order.extend(new_ids)
+        self.endInsertRows()
+
+    def set_order(self, track_ids):
+        # filtering and shuffling only swap the index array; no per-row objects are rebuilt
+        self.layoutAboutToBeChanged.emit()
+        old_order = self._order
+        self._order = array("I", track_ids)
+        new_rows = {track_id: row for row, track_id in enumerate(self._order)}
+        old_indexes = self.persistentIndexList()
+        new_indexes = []
+        for index in old_indexes:
+            row = new_rows.get(old_order[index.row()]) if index.row() < len(old_order) else None
+            new_indexes.append(self.index(row, 0) if row is not None else QModelIndex())
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
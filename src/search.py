@@ -0,0 +1,86 @@
+import unicodedata
+from array import array
+from collections import defaultdict
+from functools import partial
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def _trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self._keys = []
+        self._postings = defaultdict(partial(array, "I"))
+        self._last_query = ""
+        self._last_result = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def clear(self):
+        self._keys = []
+        self._postings = defaultdict(partial(array, "I"))
+        self._forget_last()
+
+    def add(self, texts):
+        # ids are handed out in order, so every posting list stays sorted
+        postings = self._postings
+        for text in texts:
+            track_id = len(self._keys)
+            key = normalize(text)
+            self._keys.append(key)
+            for gram in _trigrams(key):
+                postings[gram].append(track_id)
+        self._forget_last()
+
+    def search(self, query):
+        query = normalize(query)
+        if not query:
+            self._forget_last()
+            return None
+
+        if self._last_result is not None and query.startswith(self._last_query):
+            # typing more characters can only narrow the previous result set
+            candidates = self._last_result
+        else:
+            candidates = self._candidates(query)
+
+        terms = query.split(" ")
+        keys = self._keys
+        if len(terms) == 1:
+            result = [track_id for track_id in candidates if query in keys[track_id]]
+        else:
+            result = [track_id for track_id in candidates if all(term in keys[track_id] for term in terms)]
+        self._last_query = query
+        self._last_result = result
+        return result
+
+    def matches(self, track_id, query):
+        key = self._keys[track_id]
+        return all(term in key for term in normalize(query).split(" "))
+
+    def _candidates(self, query):
+        smallest = None
+        for term in query.split(" "):
+            if len(term) < 3:
+                continue
+            for gram in _trigrams(term):
+                posting = self._postings.get(gram)
+                if posting is None:
+                    return []
+                if smallest is None or len(posting) < len(smallest):
+                    smallest = posting
+        if smallest is None:
+            return range(len(self._keys))
+        return smallest
+
+    def _forget_last(self):
+        self._last_query = ""
+        self._last_result = None
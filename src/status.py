@@ -0,0 +1,56 @@
+import time
+from collections import deque
+
+from PySide6.QtCore import QObject, QTimer
+
+LEVELS = ("default", "info", "success", "error")
+# one flush per frame at 60 Hz
+FLUSH_INTERVAL_MS = 16
+HISTORY_SIZE = 200
+TOOLTIP_MESSAGES = 10
+
+
+class StatusReporter(QObject):
+    def __init__(self, label, parent=None, history_size=HISTORY_SIZE):
+        super().__init__(parent)
+        self.label = label
+        self.history = deque(maxlen=history_size)
+        self._pending = None
+        # colors come from #statusLabel[level="..."] rules in the theme stylesheet, so a message
+        # only switches a dynamic property instead of handing Qt a new stylesheet to parse
+        self.label.setProperty("level", "default")
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FLUSH_INTERVAL_MS)
+        self._timer.timeout.connect(self.flush)
+
+    def post(self, message, level="default"):
+        if level not in LEVELS:
+            level = "default"
+        self.history.append((time.time(), level, message))
+        # a burst of messages within one frame only paints the last of them
+        self._pending = (message, level)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        self._timer.stop()
+        if self._pending is None:
+            return
+        message, level = self._pending
+        self._pending = None
+        if self.label.text() != message:
+            self.label.setText(message)
+        if self.label.property("level") != level:
+            self.label.setProperty("level", level)
+            style = self.label.style()
+            style.unpolish(self.label)
+            style.polish(self.label)
+        recent = list(self.history)[-TOOLTIP_MESSAGES:]
+        self.label.setToolTip("\n".join(
+            f"{time.strftime('%H:%M:%S', time.localtime(stamp))}  {text}" for stamp, _, text in recent
+        ))
+
+    def recent(self, count=None):
+        messages = list(self.history)
+        return messages[-count:] if count else messages
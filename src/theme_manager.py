@@ -1,6 +1,23 @@
+import copy
+import hashlib
 import json
 import os
+import re
 import sys
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import QRect
+from PySide6.QtGui import QImage, QPainter, Qt
+
+try:
+    from PySide6.QtSvg import QSvgRenderer
+
+    SVG_AVAILABLE = True
+except ImportError:
+    SVG_AVAILABLE = False
+
+from utils import get_cache_dir, get_user_theme_dir
 
 
 class ThemeError(Exception):
@@ -60,6 +77,46 @@ DEFAULT_THEME = {
 }
 
 
+# bump when build_stylesheet changes so stale compiled sheets on disk are ignored
+STYLESHEET_VERSION = 3
+MAX_CACHED_STYLESHEETS = 64
+MAX_CACHED_BACKGROUNDS = 32
+MIN_WINDOW_SIZE = (640, 480)
+
+
+def theme_hash(theme):
+    payload = json.dumps([STYLESHEET_VERSION, theme], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def hash_files(paths):
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(path.encode("utf-8"))
+        try:
+            with open(path, "rb") as handle:
+                digest.update(handle.read())
+        except OSError:
+            digest.update(b"\0missing")
+    return digest.hexdigest()
+
+
+def _prune_cache(directory, suffix, keep):
+    # the GUI and catalog threads can prune at the same time, so a file may already be gone
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(suffix):
+            try:
+                entries.append((entry.stat().st_mtime_ns, entry.path))
+            except OSError:
+                pass
+    for _, stale_path in sorted(entries)[:-keep]:
+        try:
+            os.remove(stale_path)
+        except OSError:
+            pass
+
+
 def _merge_dict(base, override):
     result = dict(base)
     for key, value in (override or {}).items():
@@ -87,6 +144,17 @@ class ThemeManager:
         else:
             self.theme_dir = legacy_theme_dir
         self.default_theme_path = os.path.join(self.theme_dir, "default.json")
+        self.user_theme_dir = get_user_theme_dir()
+        self.stylesheet_cache_dir = os.path.join(get_cache_dir(), "themes")
+        self.background_cache_dir = os.path.join(get_cache_dir(), "themes", "backgrounds")
+        # (path, mtime_ns, size) -> merged theme, theme hash -> compiled stylesheet, and image path ->
+        # ((mtime_ns, size), sha1); stylesheet() also runs on the catalog thread, so all of these go through _lock
+        self._themes = {}
+        self._stylesheets = OrderedDict()
+        self._file_hashes = {}
+        # theme path -> catalog entry, rebuilt off the GUI thread by refresh_catalog
+        self._catalog = {}
+        self._lock = threading.Lock()
 
     def load_theme(self, theme_path):
         if not theme_path:
@@ -95,6 +163,16 @@ class ThemeManager:
         if not os.path.isfile(path):
             raise ThemeError(f"Theme file not found: {path}")
 
+        try:
+            stat = os.stat(path)
+        except OSError as exc:
+            raise ThemeError(f"Failed to read theme: {exc}") from exc
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._themes.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached), path
+
         try:
             with open(path, "r", encoding="utf-8") as handle:
                 loaded = json.load(handle)
@@ -105,8 +183,78 @@ class ThemeManager:
 
         merged = _merge_dict(DEFAULT_THEME, loaded)
         self._normalize_theme(merged, path)
+        self.invalidate(path)
+        with self._lock:
+            self._themes[key] = copy.deepcopy(merged)
         return merged, path
 
+    def invalidate(self, theme_path):
+        path = os.path.abspath(os.path.expanduser(theme_path))
+        with self._lock:
+            # the theme's background digest goes too, so a reload re-reads an image edited in place
+            images = {v["images"].get("window_bg") for k, v in self._themes.items() if k[0] == path}
+            self._themes = {k: v for k, v in self._themes.items() if k[0] != path}
+            for image_path in images | {path}:
+                self._file_hashes.pop(image_path, None)
+
+    def theme_dirs(self):
+        dirs = [os.path.abspath(self.theme_dir)]
+        if os.path.abspath(self.user_theme_dir) not in dirs:
+            dirs.append(os.path.abspath(self.user_theme_dir))
+        return dirs
+
+    def refresh_catalog(self):
+        # only files whose mtime or size moved are parsed and compiled again
+        with self._lock:
+            previous = dict(self._catalog)
+        catalog = {}
+        for theme_dir in self.theme_dirs():
+            try:
+                entries = sorted(entry for entry in os.listdir(theme_dir) if entry.lower().endswith(".json"))
+            except OSError:
+                continue
+            for name in entries:
+                path = os.path.join(theme_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entry = previous.get(path)
+                if entry and (entry["mtime_ns"], entry["size"]) == (stat.st_mtime_ns, stat.st_size):
+                    catalog[path] = entry
+                    continue
+                try:
+                    theme, _ = self.load_theme(path)
+                except ThemeError:
+                    continue
+                catalog[path] = {
+                    "path": path,
+                    "dir": theme_dir,
+                    "name": str(theme["meta"].get("name") or os.path.splitext(name)[0]),
+                    "author": str(theme["meta"].get("author") or ""),
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "theme": theme,
+                    "qss": self.stylesheet(theme),
+                }
+        with self._lock:
+            changed = catalog.keys() != self._catalog.keys() or any(
+                catalog[path] is not self._catalog[path] for path in catalog
+            )
+            self._catalog = catalog
+        return changed
+
+    def catalog(self):
+        with self._lock:
+            entries = list(self._catalog.values())
+        dirs = self.theme_dirs()
+        return sorted(entries, key=lambda entry: (dirs.index(entry["dir"]), entry["name"].lower(), entry["path"]))
+
+    def catalog_entry(self, theme_path):
+        path = os.path.abspath(os.path.expanduser(theme_path))
+        with self._lock:
+            return self._catalog.get(path)
+
     def load_default_theme(self):
         if os.path.isfile(self.default_theme_path):
             return self.load_theme(self.default_theme_path)
@@ -147,6 +295,9 @@ class ThemeManager:
         images["window_bg"] = bg
         theme["images"] = images
 
+        # the playlist is a QListView now; keep older themes' QListWidget rules working
+        theme["qss"] = re.sub(r"\bQListWidget\b", "QListView", theme.get("qss") or "")
+
         field_shadow = theme.get("effects", {}).get("field_shadow", "sunken")
         status_shadow = theme.get("effects", {}).get("status_shadow", "raised")
         if field_shadow not in {"plain", "raised", "sunken"}:
@@ -154,6 +305,104 @@ class ThemeManager:
         if status_shadow not in {"plain", "raised", "sunken"}:
             theme["effects"]["status_shadow"] = "raised"
 
+    def window_size(self, theme):
+        metrics = theme["metrics"]
+        return max(MIN_WINDOW_SIZE[0], metrics["window_width"]), max(MIN_WINDOW_SIZE[1], metrics["window_height"])
+
+    def stylesheet(self, theme):
+        background = theme.get("images", {}).get("window_bg", "")
+        if background:
+            raster = self.background_raster(background, self.window_size(theme))
+            if raster:
+                theme = dict(theme, images=dict(theme["images"], window_bg=raster))
+        key = theme_hash(theme)
+        with self._lock:
+            qss = self._stylesheets.get(key)
+            if qss is not None:
+                self._stylesheets.move_to_end(key)
+        if qss is not None:
+            return qss
+        cache_path = os.path.join(self.stylesheet_cache_dir, f"{key}.qss")
+        try:
+            with open(cache_path, "r", encoding="utf-8") as handle:
+                qss = handle.read()
+        except OSError:
+            qss = self.build_stylesheet(theme)
+            self._write_stylesheet(cache_path, qss)
+        with self._lock:
+            # bounded like the disk copy, since every hot-reloaded save compiles a new sheet
+            self._stylesheets[key] = qss
+            self._stylesheets.move_to_end(key)
+            while len(self._stylesheets) > MAX_CACHED_STYLESHEETS:
+                self._stylesheets.popitem(last=False)
+        return qss
+
+    def _write_stylesheet(self, cache_path, qss):
+        # the catalog compiles on a worker thread, so each writer gets its own temp file
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.stylesheet_cache_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                handle.write(qss)
+            os.replace(tmp_path, cache_path)
+            _prune_cache(self.stylesheet_cache_dir, ".qss", MAX_CACHED_STYLESHEETS)
+        except OSError:
+            pass
+
+    def _file_hash(self, path):
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._file_hashes.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(path, "rb") as handle:
+            digest = hashlib.sha1(handle.read()).hexdigest()
+        with self._lock:
+            self._file_hashes[path] = (stamp, digest)
+        return digest
+
+    def background_raster(self, image_path, size):
+        # the sheet points at a bitmap already cut to the window, so repaints never touch the SVG
+        try:
+            digest = self._file_hash(image_path)
+        except OSError:
+            return None
+        cache_path = os.path.join(self.background_cache_dir, f"{digest}-{size[0]}x{size[1]}.png")
+        if os.path.isfile(cache_path):
+            return cache_path
+
+        if image_path.lower().endswith((".svg", ".svgz")):
+            if not SVG_AVAILABLE:
+                return None
+            renderer = QSvgRenderer(image_path)
+            if not renderer.isValid():
+                return None
+            image = QImage(renderer.defaultSize(), QImage.Format.Format_ARGB32_Premultiplied)
+            image.fill(Qt.GlobalColor.transparent)
+            painter = QPainter(image)
+            renderer.render(painter)
+            painter.end()
+        else:
+            image = QImage(image_path)
+        if image.isNull():
+            return None
+
+        # same picture the stylesheet showed before: natural size, centred, clipped by the window
+        width = min(image.width(), size[0])
+        height = min(image.height(), size[1])
+        image = image.copy(QRect((image.width() - width) // 2, (image.height() - height) // 2, width, height))
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp.png"
+        try:
+            os.makedirs(self.background_cache_dir, exist_ok=True)
+            if not image.save(tmp_path, "PNG"):
+                return None
+            os.replace(tmp_path, cache_path)
+            _prune_cache(self.background_cache_dir, ".png", MAX_CACHED_BACKGROUNDS)
+        except OSError:
+            return None
+        return cache_path
+
     def build_stylesheet(self, theme):
         p = theme["palette"]
         m = theme["metrics"]
@@ -195,7 +444,19 @@ QLabel {{
     border-radius: {radius}px;
     padding: 4px 8px;
 }}
-QLineEdit, QListWidget {{
+#statusLabel {{
+    color: {p['text']};
+}}
+#statusLabel[level="info"] {{
+    color: {p['status_info']};
+}}
+#statusLabel[level="success"] {{
+    color: {p['status_success']};
+}}
+#statusLabel[level="error"] {{
+    color: {p['status_error']};
+}}
+QLineEdit, QListView {{
     background-color: {p['input_bg']};
     border: {border}px solid {p['border']};
     border-radius: {radius}px;
@@ -203,7 +464,7 @@ QLineEdit, QListWidget {{
     selection-background-color: {p['selection_bg']};
     selection-color: {p['selection_text']};
 }}
-QListWidget {{
+QListView {{
     font-size: {t['list_font_size']}pt;
 }}
 QPushButton {{
@@ -42,6 +42,29 @@ def save_config(config):
         json.dump(config, handle, indent=2)
 
 
+def get_cache_dir():
+    base_dir = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base_dir, APP_NAME)
+
+
+def get_library_db_path():
+    base_dir = os.environ.get("XDG_CONFIG_HOME", os.path.join(os.path.expanduser("~"), ".config"))
+    config_dir = os.path.join(base_dir, APP_NAME)
+    return os.path.join(config_dir, "library.db")
+
+
+def get_downloads_path():
+    base_dir = os.environ.get("XDG_CONFIG_HOME", os.path.join(os.path.expanduser("~"), ".config"))
+    config_dir = os.path.join(base_dir, APP_NAME)
+    return os.path.join(config_dir, "downloads.json")
+
+
+def get_user_theme_dir():
+    base_dir = os.environ.get("XDG_CONFIG_HOME", os.path.join(os.path.expanduser("~"), ".config"))
+    config_dir = os.path.join(base_dir, APP_NAME)
+    return os.path.join(config_dir, "themes")
+
+
 def get_theme_path():
     base_dir = os.environ.get("XDG_CONFIG_HOME", os.path.join(os.path.expanduser("~"), ".config"))
     config_dir = os.path.join(base_dir, APP_NAME)